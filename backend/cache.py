@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+
+class InMemoryCacheBackend:
+    """LRU + TTL кэш внутри процесса."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    async def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class RedisCacheBackend:
+    """Кэш вне процесса API: переживает его перезапуск.
+
+    Индексы поиска (pantry_index, suggest_index) живут в памяти одного процесса, поэтому за одним
+    Redis должен стоять один воркер uvicorn: отставший воркер положил бы в кэш устаревшую выдачу.
+
+    Вытеснение LRU делает сам Redis (maxmemory-policy allkeys-lru), TTL задаётся на ключ.
+    Инвалидация - увеличение номера поколения, старые ключи доживают свой TTL.
+    """
+
+    def __init__(self, url: str, ttl: float = 300, prefix: str = "cookwizard:search:"):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+
+    async def _generation(self) -> int:
+        return int(await self._redis.get(f"{self.prefix}generation") or 0)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._redis.get(f"{self.prefix}{await self._generation()}:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any):
+        await self._redis.set(
+            f"{self.prefix}{await self._generation()}:{key}",
+            json.dumps(value, ensure_ascii=False),
+            ex=int(self.ttl),
+        )
+
+    async def clear(self):
+        await self._redis.incr(f"{self.prefix}generation")
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class SearchCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def make_key(ingredients: Iterable[str] = (), **params) -> str:
+        key = {"ingredients": sorted({i.strip().lower() for i in ingredients if i.strip()})}
+        for name, value in sorted(params.items()):
+            if isinstance(value, str):
+                value = value.strip().lower() or None
+            key[name] = value
+        return json.dumps(key, ensure_ascii=False, sort_keys=True)
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            # Недоступный кэш не должен ломать поиск
+            print(f"⚠️ Кэш поиска недоступен: {e}")
+            self.errors += 1
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any):
+        try:
+            await self.backend.set(key, value)
+        except Exception as e:
+            print(f"⚠️ Кэш поиска недоступен: {e}")
+            self.errors += 1
+
+    async def invalidate(self):
+        try:
+            await self.backend.clear()
+        except Exception as e:
+            print(f"⚠️ Не удалось сбросить кэш поиска: {e}")
+            self.errors += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": self.backend.size(),
+        }
+
+
+def create_search_cache() -> SearchCache:
+    ttl = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+    url = os.getenv("SEARCH_CACHE_URL")
+    if url:
+        backend = RedisCacheBackend(url, ttl=ttl)
+    else:
+        backend = InMemoryCacheBackend(max_size=int(os.getenv("SEARCH_CACHE_SIZE", "1024")), ttl=ttl)
+    return SearchCache(backend)
+
+
+search_cache = create_search_cache()
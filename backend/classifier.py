@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+
+class ImageClassifier:
+    """Одна ResNet18 на весь проект: бот распознаёт фото через /api/classify, своей модели у него нет.
+
+    Запросы, пришедшие почти одновременно, идут одним батчем вне event loop.
+    """
+
+    def __init__(self, mode: str = "fast", max_batch_size: int = 16, max_wait_ms: float = 10,
+                 multi_grid: int = 2, multi_threshold: float = 0.2):
+        self.mode = mode
+        self.multi_grid = multi_grid
+        self.multi_threshold = multi_threshold
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="classifier")
+        self.state = "not_loaded"
+        self.load_seconds = None
+        self.batches = 0
+        self.images = 0
+        self.last_batch_size = 0
+        self.last_latency_ms = 0.0
+        self._model = None
+        self._idx_to_class = None
+        self._classify_batch = None
+        self._classify_multi = None
+        self._decode_image = None
+        self._load_lock: Optional[asyncio.Lock] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _load(self):
+        # torch и torchvision - только здесь, чтобы backend стартовал без них в памяти
+        from image_model import classify_batch, classify_multi, configure_threads, decode_image, load_model
+
+        started = time.perf_counter()
+        configure_threads()
+        self._model, self._idx_to_class = load_model(self.mode)
+        self._classify_batch = classify_batch
+        self._classify_multi = classify_multi
+        self._decode_image = decode_image
+        self.load_seconds = round(time.perf_counter() - started, 2)
+
+    async def ensure_loaded(self):
+        if self._model is not None:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._model is not None:
+                return
+            self.state = "loading"
+            try:
+                await asyncio.get_running_loop().run_in_executor(self.executor, self._load)
+            except Exception:
+                self.state = "failed"
+                raise
+            self.state = "ready"
+            print(f"🧠 Модель классификации загружена за {self.load_seconds} с")
+
+    async def warm_up(self):
+        try:
+            await self.ensure_loaded()
+        except Exception as e:
+            print(f"⚠️ Не удалось загрузить модель классификации: {e}")
+
+    def _predict(self, items: List[tuple], top_k: int) -> list:
+        # Обычные фото и фото в режиме нескольких продуктов - по одному проходу модели на каждую группу
+        results: list = [None] * len(items)
+        for multi in (False, True):
+            positions, images = [], []
+            for position, (data, item_multi) in enumerate(items):
+                if item_multi != multi:
+                    continue
+                # Битое изображение - ошибка только своего запроса, а не всего батча
+                try:
+                    images.append(self._decode_image(data))
+                    positions.append(position)
+                except Exception as e:
+                    results[position] = ValueError(f"Cannot decode image: {e}")
+            if not positions:
+                continue
+            if multi:
+                labels = self._classify_multi(images, self._model, self._idx_to_class, grid=self.multi_grid,
+                                              threshold=self.multi_threshold, max_labels=top_k)
+            else:
+                labels = self._classify_batch(images, self._model, self._idx_to_class, top_k)
+            for position, image_labels in zip(positions, labels):
+                results[position] = image_labels
+        return results
+
+    async def classify(self, image_bytes: bytes, top_k: int = 3, multi: bool = False) -> list:
+        """Продукты на фото по убыванию вероятности; пустой список - на фото не продукт."""
+        await self.ensure_loaded()
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_bytes, multi, top_k, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            queue_depth = self._queue.qsize()
+            top_k = max(item[2] for item in batch)
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self._predict, [item[:2] for item in batch], top_k)
+            except Exception as e:
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.images += len(batch)
+            self.last_batch_size = len(batch)
+            self.last_latency_ms = (time.perf_counter() - started) * 1000
+            print(f"🧠 Батч из {len(batch)} фото за {self.last_latency_ms:.0f} мс, в очереди {queue_depth}")
+            for (_, _, item_top_k, future), labels in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(labels, Exception):
+                    future.set_exception(labels)
+                else:
+                    future.set_result(labels[:item_top_k])
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "last_latency_ms": round(self.last_latency_ms, 1),
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+        }
+
+
+image_classifier = ImageClassifier(
+    mode=os.getenv("CLASSIFY_MODE", "fast"),
+    max_batch_size=int(os.getenv("CLASSIFY_MAX_BATCH", "16")),
+    max_wait_ms=float(os.getenv("CLASSIFY_MAX_WAIT_MS", "10")),
+    multi_grid=int(os.getenv("MULTI_GRID", "2")),
+    multi_threshold=float(os.getenv("MULTI_THRESHOLD", "0.2")),
+)
@@ -0,0 +1,111 @@
+import json
+import os
+from typing import AsyncIterable, Awaitable, Callable, Iterable, List, Optional, Union
+
+from pydantic import ValidationError
+
+from database import DISABLE_STATEMENT_TIMEOUT, async_engine
+from schemas import RecipeCreate
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+COPY_COLUMNS = ("id", "title", "ingredients", "instructions", "cooking_time", "difficulty")
+
+
+def format_validation_error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+
+async def iter_ndjson_lines(chunks: AsyncIterable[bytes]):
+    # Строки разбираются в consume(), чтобы битая строка стала ошибкой строки, а не всей загрузки
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def copy_chunk(recipes: List[RecipeCreate]) -> List[int]:
+    # id берём из последовательности заранее: COPY не умеет RETURNING
+    async with async_engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        pg = raw.driver_connection
+        async with pg.transaction():
+            # Длительность COPY ограничена размером пакета, а не statement_timeout
+            await pg.execute(DISABLE_STATEMENT_TIMEOUT)
+            ids = [row[0] for row in await pg.fetch(
+                "SELECT nextval(pg_get_serial_sequence('recipes', 'id')) FROM generate_series(1, $1)",
+                len(recipes),
+            )]
+            await pg.copy_records_to_table(
+                "recipes",
+                records=[
+                    (recipe_id, r.title, r.ingredients, r.instructions, r.cooking_time, r.difficulty)
+                    for recipe_id, r in zip(ids, recipes)
+                ],
+                columns=COPY_COLUMNS,
+            )
+    return ids
+
+
+async def ingest_recipes(rows: Union[Iterable[dict], AsyncIterable[dict]],
+                         chunk_size: int = BULK_CHUNK_SIZE,
+                         on_inserted: Optional[Callable[[List[int], List[RecipeCreate]], Awaitable[None]]] = None) -> dict:
+    report = {"inserted": 0, "failed": 0, "index_errors": 0, "chunks": []}
+    chunk: List[RecipeCreate] = []
+    errors: List[dict] = []
+    row_number = 0
+
+    async def flush():
+        chunk_report = {"chunk": len(report["chunks"]), "inserted": 0, "errors": list(errors)}
+        failed = len(errors)
+        if chunk:
+            try:
+                ids = await copy_chunk(chunk)
+            except Exception as e:
+                chunk_report["error"] = str(e)
+                failed += len(chunk)
+            else:
+                chunk_report["inserted"] = len(ids)
+                report["inserted"] += len(ids)
+                if on_inserted:
+                    # Строки уже закоммичены: сбой индексации не должен терять отчёт о них
+                    try:
+                        await on_inserted(ids, list(chunk))
+                    except Exception as e:
+                        chunk_report["index_error"] = str(e)
+                        report["index_errors"] += 1
+                        print(f"⚠️ Пакет {chunk_report['chunk']} записан, но не проиндексирован: {e}")
+        report["failed"] += failed
+        report["chunks"].append(chunk_report)
+        print(f"   Пакет {chunk_report['chunk']}: добавлено {chunk_report['inserted']}, ошибок {failed}")
+        chunk.clear()
+        errors.clear()
+
+    async def consume(data):
+        nonlocal row_number
+        try:
+            if isinstance(data, bytes):
+                data = json.loads(data)
+            chunk.append(RecipeCreate.parse_obj(data))
+        except ValidationError as e:
+            errors.append({"row": row_number, "error": format_validation_error(e)})
+        except ValueError as e:
+            errors.append({"row": row_number, "error": f"invalid JSON: {e}"})
+        row_number += 1
+        if len(chunk) + len(errors) >= chunk_size:
+            await flush()
+
+    if hasattr(rows, "__aiter__"):
+        async for data in rows:
+            await consume(data)
+    else:
+        for data in rows:
+            await consume(data)
+    if chunk or errors:
+        await flush()
+    return report
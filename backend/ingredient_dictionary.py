@@ -0,0 +1,83 @@
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+
+def normalize_ingredient(name: str) -> str:
+    # То же правило, что SQL-функция normalize_ingredient() из миграции 0004
+    return " ".join(name.lower().split()).replace("ё", "е")
+
+
+class IngredientDictionary:
+    """Копия ingredient_synonyms в памяти: любое написание -> канонический id ингредиента."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, ingredient_id: int, name: str, synonyms: Iterable[str] = ()):
+        with self._lock:
+            self._names[ingredient_id] = name
+            for synonym in [name, *synonyms]:
+                self._ids[normalize_ingredient(synonym)] = ingredient_id
+
+    def load(self, ingredients, synonyms):
+        with self._lock:
+            self._names = {row.id: row.name for row in ingredients}
+            self._ids = {row.synonym: row.ingredient_id for row in synonyms}
+
+    def resolve(self, names: Iterable[str]) -> List[int]:
+        """id ингредиентов без повторов, в порядке ввода; неизвестные написания пропускаются."""
+        ids: List[int] = []
+        for name in names:
+            ingredient_id = self._ids.get(normalize_ingredient(name))
+            if ingredient_id is not None and ingredient_id not in ids:
+                ids.append(ingredient_id)
+        return ids
+
+    def name(self, ingredient_id: int) -> str:
+        return self._names[ingredient_id]
+
+    def names(self) -> Dict[int, str]:
+        with self._lock:
+            return dict(self._names)
+
+    def synonyms(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return list(self._ids.items())
+
+
+ingredient_dictionary = IngredientDictionary()
+
+
+async def load_ingredient_dictionary(db: AsyncSession):
+    ingredients = (await db.execute(select(models.IngredientDB.id, models.IngredientDB.name))).all()
+    synonyms = (await db.execute(
+        select(models.IngredientSynonymDB.synonym, models.IngredientSynonymDB.ingredient_id)
+    )).all()
+    ingredient_dictionary.load(ingredients, synonyms)
+
+
+async def recipe_ingredient_ids(db: AsyncSession, recipe_ids: List[int]) -> Dict[int, List[int]]:
+    """Связи, которые триггер только что построил для новых рецептов.
+
+    Новые ингредиенты попутно попадают в словарь: их каноническое имя и есть написание из рецепта.
+    """
+    rows = (await db.execute(
+        select(models.RecipeIngredientDB.recipe_id, models.IngredientDB.id, models.IngredientDB.name)
+        .join(models.IngredientDB, models.IngredientDB.id == models.RecipeIngredientDB.ingredient_id)
+        .where(models.RecipeIngredientDB.recipe_id.in_(recipe_ids))
+    )).all()
+    result: Dict[int, List[int]] = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id, name in rows:
+        result[recipe_id].append(ingredient_id)
+        ingredient_dictionary.add(ingredient_id, name)
+    return result
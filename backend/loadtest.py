@@ -0,0 +1,102 @@
+"""Нагрузочный тест API: N клиентов с keep-alive соединениями, запросы/с и задержки.
+
+Только стандартная библиотека, чтобы запускать рядом с любой сборкой backend:
+    python loadtest.py --url http://localhost:8000 --concurrency 128 --duration 20 \
+        --path "/api/search?ingredients=курица,лук" --path "/api/recipes/1"
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from urllib.parse import quote, urlsplit
+
+
+async def read_response(reader: asyncio.StreamReader) -> int:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("соединение закрыто сервером")
+    status = int(status_line.split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value:
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status
+
+
+async def client(host: str, port: int, paths, deadline: float, latencies: list, errors: list):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        path = next(paths)
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode())
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def percentile(values: list, p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+
+async def run(url: str, paths: list, concurrency: int, duration: float) -> dict:
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    # Кириллица в query-строке - в percent-encoding, как её отправил бы браузер
+    paths = itertools.cycle([quote(p, safe="/?&=,:") for p in paths])
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, paths, deadline, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест CookWizard API")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", action="append", help="Путь запроса, можно несколько (идут по кругу)")
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+    paths = args.path or ["/api/search?ingredients=курица,лук", "/api/recipes/1", "/api/recipes?limit=20"]
+    print(f"🚀 {args.concurrency} клиентов, {args.duration} с: {args.url}")
+    report = asyncio.run(run(args.url, paths, args.concurrency, args.duration))
+    print(" ".join(f"{name}={value}" for name, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,674 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import REAL, and_, cast, func, or_, select, text
+from sqlalchemy.exc import DBAPIError
+from typing import List, Literal, Optional
+import asyncio
+import base64
+import functools
+import json
+import os
 import models
-from database import engine, get_db
-
-models.Base.metadata.create_all(bind=engine)
+from database import DISABLE_STATEMENT_TIMEOUT, PoolTimeoutError, get_async_db, get_pool_stats, async_engine, AsyncSessionLocal
+from pantry_index import pantry_index
+from suggest_index import suggest_index
+from ingredient_dictionary import ingredient_dictionary, load_ingredient_dictionary, recipe_ingredient_ids
+from cache import search_cache
+from schemas import RecipeCreate
+from ingest import BULK_CHUNK_SIZE, ingest_recipes, iter_ndjson_lines
+from classifier import image_classifier
+from metrics import MetricsMiddleware, SEARCH_RESULTS, instrument_engine, register_stats, render_metrics
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_CHUNK_SIZE = 500
+# Общий лимит на запрос; 0 - без ограничения. Загрузка рецептов и распознавание фото ограничены
+# размером тела и загрузкой модели, а не временем, поэтому на них лимит не действует
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "15"))
+NO_TIMEOUT_PATHS = ("/api/recipes/bulk", "/api/classify")
+# Postgres: запрос отменён по statement_timeout
+QUERY_CANCELED = "57014"
 
 app = FastAPI(title="CookWizard API")
 
 app.router.redirect_slashes = False
 
 
-class RecipeBase(BaseModel):
-    title: str
-    ingredients: List[str]
-    instructions: str
-    cooking_time: int
-    difficulty: str
+def service_unavailable(detail: str) -> JSONResponse:
+    # Retry-After: перегрузка кратковременная, клиенту (боту, фронтенду) стоит повторить
+    return JSONResponse(status_code=503, content={"detail": detail}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_exhausted(request: Request, exc: PoolTimeoutError):
+    print(f"⚠️ Пул соединений исчерпан: {request.url.path}")
+    return service_unavailable("Database is busy, try again later")
+
+
+@app.exception_handler(DBAPIError)
+async def database_error(request: Request, exc: DBAPIError):
+    if getattr(exc.orig, "sqlstate", None) != QUERY_CANCELED:
+        raise exc
+    print(f"⚠️ Запрос к БД прерван по statement_timeout: {request.url.path}")
+    return service_unavailable("Database query timed out")
+
+
+class RequestTimeoutMiddleware:
+    """Лимит времени до начала ответа. Чистый ASGI, а не @app.middleware("http"): обработчик
+    выполняется в задаче самого запроса и по таймауту отменяется, а не продолжает держать
+    соединение с БД после того, как клиент уже получил 503.
+    """
+
+    def __init__(self, app, timeout: float, exempt_paths=()):
+        self.app = app
+        self.timeout = timeout
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.timeout or scope["path"] in self.exempt_paths:
+            return await self.app(scope, receive, send)
+        deadline = asyncio.timeout(self.timeout)
+        response_started = False
+
+        async def send_and_track(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                # Заголовки ушли: потоковое тело (NDJSON) лимитом не обрезается
+                deadline.reschedule(None)
+            await send(message)
+
+        try:
+            async with deadline:
+                await self.app(scope, receive, send_and_track)
+        except TimeoutError:
+            # TimeoutError изнутри обработчика (чужой таймаут) - не наш случай
+            if not deadline.expired() or response_started:
+                raise
+            print(f"⚠️ Запрос не уложился в {self.timeout} с: {scope['path']}")
+            await service_unavailable("Request timed out")(scope, receive, send)
+
+
+app.add_middleware(RequestTimeoutMiddleware, timeout=REQUEST_TIMEOUT, exempt_paths=NO_TIMEOUT_PATHS)
+# Снаружи всех остальных middleware: в метрики попадают и 503 от RequestTimeoutMiddleware
+app.add_middleware(MetricsMiddleware)
+instrument_engine(async_engine.sync_engine)
+register_stats(
+    "cookwizard",
+    {"search_cache": search_cache.stats, "db_pool": get_pool_stats, "classifier": image_classifier.stats},
+    counters=("hits", "misses", "errors", "checkouts", "timeouts", "batches", "images"),
+)
+
+
+@app.on_event("startup")
+async def build_search_index():
+    links = models.RecipeIngredientDB
+    async with AsyncSessionLocal() as db:
+        # Полный проход по корпусу при старте - не повод срабатывать statement_timeout
+        await db.execute(text(DISABLE_STATEMENT_TIMEOUT))
+        await load_ingredient_dictionary(db)
+        result = await db.execute(
+            select(
+                models.RecipeDB.id,
+                models.RecipeDB.title,
+                models.RecipeDB.cooking_time,
+                models.RecipeDB.difficulty,
+                func.array_agg(links.ingredient_id).filter(links.ingredient_id.is_not(None)).label("ingredient_ids"),
+            )
+            .outerjoin(links, links.recipe_id == models.RecipeDB.id)
+            .group_by(models.RecipeDB.id)
+        )
+        rows = result.all()
+    pantry_index.build(rows)
+    suggest_index.build(
+        [row.title for row in rows], [row.ingredient_ids for row in rows],
+        ingredient_dictionary.names(), ingredient_dictionary.synonyms(),
+    )
+    print(f"📇 Индекс ингредиентов построен: {len(pantry_index)} рецептов, {len(ingredient_dictionary)} ингредиентов")
+
+
+def index_recipe(recipe_id: int, title: str, ingredient_ids: List[int], cooking_time: Optional[int],
+                 difficulty: Optional[str]):
+    pantry_index.add(recipe_id, ingredient_ids, cooking_time, difficulty)
+    suggest_index.add_recipe(title, [(i, ingredient_dictionary.name(i)) for i in ingredient_ids])
+
+
+@app.on_event("startup")
+async def warm_up_classifier():
+    # Модель грузится в фоне, остальные эндпоинты работают сразу. CLASSIFIER_WARMUP=0 - загрузка
+    # при первом /api/classify, если фото распознавать не нужно
+    if os.getenv("CLASSIFIER_WARMUP", "1") == "1":
+        app.state.classifier_warmup = asyncio.create_task(image_classifier.warm_up())
+
+
+# summary - только то, что нужно спискам результатов; тело рецепта берётся из /api/recipes/{id}
+RECIPE_VIEWS = {
+    "full": ("id", "title", "ingredients", "instructions", "cooking_time", "difficulty"),
+    "summary": ("id", "title", "cooking_time", "difficulty"),
+}
+RecipeView = Literal["full", "summary"]
+# any - рецепты, где есть хоть один из ингредиентов; pantry - по доле ингредиентов рецепта, которые уже есть
+SearchMode = Literal["any", "pantry"]
+CURSOR_LENGTHS = {"any": 3, "pantry": 4}
+
+
+def recipe_columns(view: str = "full"):
+    return [getattr(models.RecipeDB, name) for name in RECIPE_VIEWS[view]]
+
+
+def recipe_to_dict(recipe, view: str = "full") -> dict:
+    return {name: getattr(recipe, name) for name in RECIPE_VIEWS[view]}
+
+
+def title_filter(title_part: str):
+    # lower(title) LIKE ... совпадает с выражением trigram-индекса ix_recipes_title_trgm
+    return func.lower(models.RecipeDB.title).like(f"%{title_part.lower()}%")
+
+
+def apply_filters(query, title: Optional[str], max_time: Optional[int], difficulty: Optional[str]):
+    if title:
+        query = query.where(title_filter(title))
+    if max_time:
+        query = query.where(models.RecipeDB.cooking_time <= max_time)
+    if difficulty:
+        query = query.where(models.RecipeDB.difficulty == difficulty)
+    return query
+
+
+def filtered_query(title: Optional[str], max_time: Optional[int], difficulty: Optional[str],
+                   view: str = "full"):
+    return apply_filters(select(*recipe_columns(view)), title, max_time, difficulty).order_by(models.RecipeDB.id)
+
+
+def has_any_ingredient(ingredient_ids: List[int]):
+    # Целочисленный поиск по ix_recipe_ingredients_ingredient вместо сравнения строк
+    return models.RecipeDB.id.in_(
+        select(models.RecipeIngredientDB.recipe_id)
+        .where(models.RecipeIngredientDB.ingredient_id.in_(ingredient_ids))
+    )
+
+
+def fulltext_query(q: str, title: Optional[str], max_time: Optional[int], difficulty: Optional[str],
+                   view: str = "full", ingredient_ids: Optional[List[int]] = None, after: Optional[tuple] = None):
+    # search_vector: название (A) > ингредиенты (B) > инструкции (C), словоформы через russian-стеммер
+    ts_query = func.websearch_to_tsquery("russian", q)
+    rank = func.ts_rank(models.RecipeDB.search_vector, ts_query)
+    query = select(*recipe_columns(view), rank.label("rank")).where(models.RecipeDB.search_vector.op("@@")(ts_query))
+    query = apply_filters(query, title, max_time, difficulty)
+    if ingredient_ids is not None:
+        query = query.where(has_any_ingredient(ingredient_ids))
+    if after is not None:
+        # ts_rank возвращает real: сравниваем с тем же типом, иначе равенство на границе страницы не сработает
+        after_rank, after_id = cast(after[0], REAL), after[1]
+        query = query.where(or_(rank < after_rank, and_(rank == after_rank, models.RecipeDB.id > after_id)))
+    return query.order_by(rank.desc(), models.RecipeDB.id)
+
+
+def encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
+# recipes.id - integer в Postgres: id за его пределами asyncpg не передаст
+MAX_RECIPE_ID = 2 ** 31 - 1
 
-class RecipeCreate(RecipeBase):
-    pass
 
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
 
-class Recipe(RecipeBase):
-    id: int
 
-    class Config:
-        orm_mode = True
+def is_recipe_id(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and abs(value) <= MAX_RECIPE_ID
+
+
+def decode_keyset_cursor(cursor: str, length: int) -> tuple:
+    # Курсор приходит от клиента: кроме длины проверяем, что это числа, а последний элемент - целый id
+    after = decode_cursor(cursor)
+    if not (isinstance(after, list) and len(after) == length and all(map(is_number, after))
+            and is_recipe_id(after[-1])):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return tuple(after)
+
+
+def wants_ndjson(request: Request, format: Optional[str]) -> bool:
+    return format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(rows) -> StreamingResponse:
+    return StreamingResponse(
+        (json.dumps(row, ensure_ascii=False) + "\n" async for row in rows),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
+
+
+async def count_results(rows, kind: str):
+    count = 0
+    async for row in rows:
+        count += 1
+        yield row
+    SEARCH_RESULTS.labels(kind).observe(count)
+
+
+async def rank_recipes(mode: str, ingredient_ids: List[int], max_missing: Optional[int] = None, **filters):
+    if mode == "pantry":
+        rank = functools.partial(pantry_index.rank, ingredient_ids, max_missing=max_missing, **filters)
+    else:
+        rank = functools.partial(pantry_index.rank_any, ingredient_ids, **filters)
+    # NumPy отпускает GIL: на большом корпусе ранжирование не держит event loop
+    return await asyncio.get_running_loop().run_in_executor(None, rank)
+
+
+def match_to_dict(match, recipe, view: str, mode: str) -> dict:
+    item = recipe_to_dict(recipe, view)
+    if mode == "pantry":
+        # Сколько ингредиентов рецепта уже есть и сколько придётся докупить
+        item.update({"matched": match.matched, "missing": match.missing, "coverage": round(match.coverage, 4)})
+    return item
+
+
+async def ranked_search_page(db: AsyncSession, ingredient_ids: List[int], title: Optional[str],
+                             max_time: Optional[int], difficulty: Optional[str],
+                             limit: Optional[int], after: Optional[tuple], view: str = "full",
+                             mode: str = "any", max_missing: Optional[int] = None):
+    # Кандидаты и их ранг берём из индекса, из базы читаем только нужные строки
+    matches = await rank_recipes(
+        mode,
+        ingredient_ids,
+        max_missing=max_missing,
+        max_time=max_time,
+        difficulty=difficulty,
+        limit=None if title or not limit else limit + 1,
+        after=after,
+    )
+    if not matches:
+        return [], None
+    query = select(*recipe_columns(view))
+    if title:
+        # recipe_ingredients и trigram-индекс lower(title) отбирают строки в базе
+        query = query.where(has_any_ingredient(ingredient_ids), title_filter(title))
+    else:
+        query = query.where(models.RecipeDB.id.in_([m.recipe_id for m in matches]))
+    by_id = {recipe.id: recipe for recipe in (await db.execute(query)).all()}
+    page = [(m, by_id[m.recipe_id]) for m in matches if m.recipe_id in by_id]
+
+    next_cursor = None
+    if limit and len(page) > limit:
+        page = page[:limit]
+        last = page[-1][0]
+        next_cursor = encode_cursor(list(last.sort_key))
+    return [match_to_dict(m, recipe, view, mode) for m, recipe in page], next_cursor
+
+
+async def stream_search(user_ingredients: List[str], ingredient_ids: List[int], title: Optional[str],
+                        max_time: Optional[int], difficulty: Optional[str], limit: Optional[int], after,
+                        view: str = "full", mode: str = "any", max_missing: Optional[int] = None):
+    # Отдельная сессия: генератор живёт дольше обработчика запроса
+    async with AsyncSessionLocal() as db:
+        if user_ingredients:
+            matches = await rank_recipes(
+                mode,
+                ingredient_ids,
+                max_missing=max_missing,
+                max_time=max_time,
+                difficulty=difficulty,
+                limit=None if title else limit,
+                after=after,
+            )
+            sent = 0
+            for start in range(0, len(matches), STREAM_CHUNK_SIZE):
+                chunk = matches[start:start + STREAM_CHUNK_SIZE]
+                query = select(*recipe_columns(view)).where(models.RecipeDB.id.in_([m.recipe_id for m in chunk]))
+                if title:
+                    query = query.where(title_filter(title))
+                by_id = {recipe.id: recipe for recipe in (await db.execute(query)).all()}
+                for m in chunk:
+                    if m.recipe_id in by_id:
+                        yield match_to_dict(m, by_id[m.recipe_id], view, mode)
+                        sent += 1
+                        if limit and sent >= limit:
+                            return
+        else:
+            query = filtered_query(title, max_time, difficulty, view)
+            if after is not None:
+                query = query.where(models.RecipeDB.id > after)
+            if limit:
+                query = query.limit(limit)
+            result = await db.stream(query.execution_options(yield_per=STREAM_CHUNK_SIZE))
+            async for recipe in result:
+                yield recipe_to_dict(recipe, view)
+
+
+async def stream_recipes(query, view: str = "full"):
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        async for recipe in result:
+            yield recipe_to_dict(recipe, view)
 
 
 @app.get("/api/search")
-def search_recipes(
+async def search_recipes(
+        request: Request,
+        response: Response,
         ingredients: Optional[str] = Query(None, description="Ингредиенты через запятую"),
         title: Optional[str] = Query(None, description="Название рецепта (поиск по части названия)"),
+        q: Optional[str] = Query(None, description="Полнотекстовый поиск по названию, ингредиентам и инструкциям"),
         max_time: Optional[int] = None,
         difficulty: Optional[str] = None,
-        db: Session = Depends(get_db)
+        limit: Optional[int] = Query(None, ge=1, description="Сколько лучших рецептов вернуть"),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        format: Optional[str] = Query(None, description="ndjson - потоковая выдача построчно"),
+        view: RecipeView = Query("full", description="summary - без ингредиентов и инструкций"),
+        mode: SearchMode = Query("any", description="pantry - ранжировать по доле ингредиентов рецепта, которые есть"),
+        max_missing: Optional[int] = Query(None, ge=0, description="pantry: не больше стольких недостающих ингредиентов"),
+        db: AsyncSession = Depends(get_async_db)
 ):
 
-    print(f"🔍 ПОИСК ВЫЗВАН: ingredients={ingredients}, title={title}")
-    query = db.query(models.RecipeDB)
-
-    if ingredients:
-        user_ingredients = [i.strip().lower() for i in ingredients.split(",")]
-        conditions = []
-        for ingredient in user_ingredients:
-            conditions.append(models.RecipeDB.ingredients.any(ingredient))
-
-        if conditions:
-            query = query.filter(or_(*conditions))
-
-    if title:
-        title_lower = title.lower()
-        query = query.filter(models.RecipeDB.title.ilike(f"%{title_lower}%"))
-    if max_time:
-        query = query.filter(models.RecipeDB.cooking_time <= max_time)
-    if difficulty:
-        query = query.filter(models.RecipeDB.difficulty == difficulty.lower())
-    recipes = query.all()
-    results = []
-    for recipe in recipes:
-        results.append({
-            "id": recipe.id,
-            "title": recipe.title,
-            "ingredients": recipe.ingredients,
-            "instructions": recipe.instructions,
-            "cooking_time": recipe.cooking_time,
-            "difficulty": recipe.difficulty,
-        })
-
-    print(f"✅ Найдено {len(results)} рецептов")
-    return results
+    q = q.strip() if q else None
+    difficulty = difficulty.lower() if difficulty else None
+    user_ingredients = [i.strip().lower() for i in ingredients.split(",") if i.strip()] if ingredients else []
+    # Синонимы сводятся к каноническим id один раз; неизвестные ингредиенты ни с чем не совпадут
+    ingredient_ids = ingredient_dictionary.resolve(user_ingredients)
+
+    after = None
+    if cursor:
+        if q:
+            after = decode_keyset_cursor(cursor, 2)
+        elif user_ingredients:
+            after = decode_keyset_cursor(cursor, CURSOR_LENGTHS[mode])
+        else:
+            after = decode_cursor(cursor)
+            if not is_recipe_id(after):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Метка гистограммы размера выдачи
+    kind = "fulltext" if q else mode if user_ingredients else "filters"
+    if q:
+        # Ингредиенты в полнотекстовом режиме - фильтр, порядок задаёт ts_rank
+        query = fulltext_query(q, title, max_time, difficulty, view,
+                               ingredient_ids if user_ingredients else None, after)
+        if wants_ndjson(request, format):
+            return ndjson_response(count_results(stream_recipes(query.limit(limit) if limit else query, view), kind))
+    elif wants_ndjson(request, format):
+        return ndjson_response(count_results(stream_search(
+            user_ingredients, ingredient_ids, title, max_time, difficulty, limit, after, view, mode, max_missing
+        ), kind))
+
+    cache_key = search_cache.make_key(
+        [str(i) for i in ingredient_ids], by_ingredients=bool(user_ingredients), title=title, max_time=max_time,
+        difficulty=difficulty, limit=limit, cursor=cursor, view=view, mode=mode, max_missing=max_missing, q=q,
+    )
+    page = await search_cache.get(cache_key)
+    if page is None:
+        if q:
+            rows = (await db.execute(query.limit(limit + 1) if limit else query)).all()
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor([rows[-1].rank, rows[-1].id])
+            results = [recipe_to_dict(row, view) for row in rows]
+        elif user_ingredients:
+            results, next_cursor = await ranked_search_page(
+                db, ingredient_ids, title, max_time, difficulty, limit, after, view, mode, max_missing
+            )
+        else:
+            query = filtered_query(title, max_time, difficulty, view)
+            if after is not None:
+                query = query.where(models.RecipeDB.id > after)
+            if limit:
+                query = query.limit(limit + 1)
+            recipes = (await db.execute(query)).all()
+            next_cursor = None
+            if limit and len(recipes) > limit:
+                recipes = recipes[:limit]
+                next_cursor = encode_cursor(recipes[-1].id)
+            results = [recipe_to_dict(recipe, view) for recipe in recipes]
+        page = {"items": results, "next_cursor": next_cursor}
+        await search_cache.set(cache_key, page)
+
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+
+    SEARCH_RESULTS.labels(kind).observe(len(page["items"]))
+    return page["items"]
 
 
 @app.get("/api/search/title/{title_part}")
-def search_by_title(
+async def search_by_title(
         title_part: str,
-        db: Session = Depends(get_db)
+        view: RecipeView = Query("full", description="summary - без ингредиентов и инструкций"),
+        db: AsyncSession = Depends(get_async_db)
 ):
 
-    recipes = db.query(models.RecipeDB) \
-        .filter(models.RecipeDB.title.ilike(f"%{title_part}%")) \
-        .all()
-
-    results = []
-    for recipe in recipes:
-        results.append({
-            "id": recipe.id,
-            "title": recipe.title,
-            "ingredients": recipe.ingredients,
-            "instructions": recipe.instructions,
-            "cooking_time": recipe.cooking_time,
-            "difficulty": recipe.difficulty,
-        })
+    recipes = (await db.execute(
+        select(*recipe_columns(view)).where(title_filter(title_part))
+    )).all()
 
-    return results
+    return [recipe_to_dict(recipe, view) for recipe in recipes]
 
 
 @app.get("/api/recipes")
-def get_all_recipes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    recipes = db.query(models.RecipeDB).offset(skip).limit(limit).all()
-    return recipes
+async def get_all_recipes(
+        request: Request,
+        response: Response,
+        skip: int = 0,
+        limit: Optional[int] = Query(None, ge=1),
+        cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+        format: Optional[str] = Query(None, description="ndjson - потоковая выдача построчно"),
+        view: RecipeView = Query("full", description="summary - без ингредиентов и инструкций"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    query = select(*recipe_columns(view)).order_by(models.RecipeDB.id)
+    if cursor:
+        after_id = decode_cursor(cursor)
+        if not is_recipe_id(after_id):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(models.RecipeDB.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+
+    if wants_ndjson(request, format):
+        return ndjson_response(stream_recipes(query.limit(limit) if limit else query, view))
+
+    limit = limit or 100
+    recipes = (await db.execute(query.limit(limit + 1))).all()
+    if len(recipes) > limit:
+        recipes = recipes[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(recipes[-1].id)
+    return [recipe_to_dict(recipe, view) for recipe in recipes]
 
 
 @app.get("/api/recipes/{recipe_id}")
-def get_recipe(recipe_id: int, db: Session = Depends(get_db)):
-    recipe = db.query(models.RecipeDB).filter(models.RecipeDB.id == recipe_id).first()
+async def get_recipe(recipe_id: int, db: AsyncSession = Depends(get_async_db)):
+    recipe = await db.get(models.RecipeDB, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
     return recipe
 
 
 @app.post("/api/recipes")
-def create_recipe(recipe: RecipeCreate, db: Session = Depends(get_db)):
+async def create_recipe(recipe: RecipeCreate, db: AsyncSession = Depends(get_async_db)):
     db_recipe = models.RecipeDB(**recipe.dict())
     db.add(db_recipe)
-    db.commit()
-    db.refresh(db_recipe)
+    await db.commit()
+    await db.refresh(db_recipe)
+    ingredient_ids = await recipe_ingredient_ids(db, [db_recipe.id])
+    index_recipe(db_recipe.id, db_recipe.title, ingredient_ids[db_recipe.id], db_recipe.cooking_time,
+                 db_recipe.difficulty)
+    await search_cache.invalidate()
     return db_recipe
 
 
+@app.post("/api/recipes/bulk")
+async def bulk_create_recipes(
+        request: Request,
+        chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=100000, description="Рецептов в одном COPY"),
+):
+    if NDJSON_MEDIA_TYPE in request.headers.get("content-type", ""):
+        rows = iter_ndjson_lines(request.stream())
+    else:
+        try:
+            rows = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+
+    async def index_chunk(ids, recipes):
+        async with AsyncSessionLocal() as db:
+            ingredient_ids = await recipe_ingredient_ids(db, ids)
+        for recipe_id, recipe in zip(ids, recipes):
+            index_recipe(recipe_id, recipe.title, ingredient_ids[recipe_id], recipe.cooking_time, recipe.difficulty)
+
+    print(f"📦 Массовая загрузка рецептов, пакеты по {chunk_size}")
+    try:
+        report = await ingest_recipes(rows, chunk_size=chunk_size, on_inserted=index_chunk)
+    finally:
+        # Пакеты до сбоя уже закоммичены: кэш сбрасывается в любом случае
+        await search_cache.invalidate()
+    if report["index_errors"]:
+        print(f"⚠️ {report['index_errors']} пакетов не попали в индексы поиска до перезапуска API")
+    print(f"✅ Загружено {report['inserted']} рецептов, ошибок {report['failed']}")
+    return report
+
+
+@app.get("/api/ingredients/resolve")
+async def resolve_ingredients(names: str = Query(..., description="Ингредиенты через запятую")):
+    result = []
+    for name in (n.strip() for n in names.split(",")):
+        if not name:
+            continue
+        ids = ingredient_dictionary.resolve([name])
+        result.append({
+            "input": name,
+            "id": ids[0] if ids else None,
+            "name": ingredient_dictionary.name(ids[0]) if ids else None,
+        })
+    return result
+
+
+@app.get("/api/suggest")
+async def suggest(
+        prefix: str = Query(..., min_length=1, description="Начало ингредиента или названия"),
+        kind: Literal["ingredient", "title"] = "ingredient",
+        limit: int = Query(10, ge=1, le=50),
+):
+    # Без обращения к БД: подсказки запрашиваются на каждое нажатие клавиши
+    if kind == "title":
+        return suggest_index.suggest_titles(prefix, limit)
+    return suggest_index.suggest_ingredients(prefix, limit)
+
+
+@app.get("/api/stats/ingredients")
+async def ingredient_stats(
+        limit: int = Query(10, ge=1, le=1000, description="Сколько самых популярных ингредиентов вернуть"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    # Счётчики по каноническим ингредиентам: синонимы уже сложены в одну строку
+    rows = (await db.execute(
+        select(models.IngredientDB.name, models.IngredientStatDB.recipe_count)
+        .join(models.IngredientDB, models.IngredientDB.id == models.IngredientStatDB.ingredient_id)
+        .order_by(models.IngredientStatDB.recipe_count.desc(), models.IngredientDB.name)
+        .limit(limit)
+    )).all()
+    return [{"ingredient": row.name, "count": row.recipe_count} for row in rows]
+
+
+@app.get("/api/stats/difficulty")
+async def difficulty_stats(db: AsyncSession = Depends(get_async_db)):
+    rows = (await db.execute(
+        select(models.RecipeDB.difficulty, func.count())
+        .group_by(models.RecipeDB.difficulty)
+        .order_by(models.RecipeDB.difficulty)
+    )).all()
+    return [{"difficulty": difficulty, "count": count} for difficulty, count in rows]
+
+
+@app.get("/api/stats/time")
+async def time_stats(
+        bucket: int = Query(15, ge=1, le=600, description="Ширина интервала в минутах"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    start = (models.RecipeDB.cooking_time // bucket) * bucket
+    rows = (await db.execute(
+        select(start.label("start"), func.count())
+        .where(models.RecipeDB.cooking_time.is_not(None))
+        .group_by("start")
+        .order_by("start")
+    )).all()
+    return [{"from": row.start, "to": row.start + bucket - 1, "count": row[1]} for row in rows]
+
+
+@app.post("/api/classify")
+async def classify_image(
+        request: Request,
+        top_k: int = Query(3, ge=1, le=10, description="Сколько продуктов вернуть"),
+        multi: bool = Query(False, description="Все продукты на фото по сетке, а не только главный"),
+):
+    image_bytes = await request.body()
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="Empty image")
+    try:
+        # Пустой labels - продуктов на фото не нашлось
+        labels = await image_classifier.classify(image_bytes, top_k, multi)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        if image_classifier.state != "ready":
+            raise HTTPException(status_code=503, detail=f"Classifier unavailable: {e}")
+        raise
+    return {"labels": labels}
+
+
+@app.get("/api/classify/stats")
+async def classify_stats():
+    return image_classifier.stats()
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return search_cache.stats()
+
+
+@app.get("/api/db/pool")
+async def db_pool_stats():
+    return get_pool_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
+
 @app.get("/health")
-def health_check():
-    return {"status": "healthy"}
+async def health_check():
+    return {"status": "healthy", "classifier": image_classifier.state}
 
 
 @app.get("/")
-def root():
+async def root():
     return {
         "message": "CookWizard API v3",
         "endpoints": {
             "search": "/api/search?ingredients=chicken,potato&title=курица",
+            "fulltext_search": "/api/search?q=курицей с картошкой",
+            "pantry_search": "/api/search?ingredients=курица,яйца,лук&mode=pantry&max_missing=2",
             "search_by_title": "/api/search/title/{title_part}",
             "all_recipes": "/api/recipes",
             "get_recipe": "/api/recipes/{id}",
+            "bulk_create": "POST /api/recipes/bulk",
+            "resolve_ingredients": "/api/ingredients/resolve?names=куриное филе,яйца",
+            "suggest": "/api/suggest?prefix=кур&kind=ingredient",
+            "ingredient_stats": "/api/stats/ingredients?limit=10",
+            "db_pool": "/api/db/pool",
+            "metrics": "/metrics",
+            "classify": "POST /api/classify?multi=false (тело - изображение)",
             "docs": "/docs"
         }
     }
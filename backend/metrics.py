@@ -0,0 +1,105 @@
+import time
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+# Горячий путь - только perf_counter и observe()/inc() по готовым меткам; всё, что уже считают
+# кэш, пул и классификатор, собирается лишь в момент опроса /metrics (StatsCollector)
+
+REQUESTS = Counter("cookwizard_http_requests_total", "HTTP-запросы", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+    "cookwizard_http_request_duration_seconds", "Время обработки HTTP-запроса (до последнего байта ответа)",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+SEARCH_RESULTS = Histogram(
+    "cookwizard_search_results", "Сколько рецептов вернул /api/search", ["kind"],
+    buckets=(0, 1, 5, 10, 20, 50, 100, 500, 1000, 5000, 20000),
+)
+DB_QUERY_LATENCY = Histogram(
+    "cookwizard_db_query_duration_seconds", "Время SQL-запроса от отправки до ответа драйвера", ["statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+
+# Метка statement - только тип запроса: сам текст дал бы неограниченное число рядов
+STATEMENT_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def statement_kind(statement: str) -> str:
+    kind = statement.lstrip()[:6].upper()
+    if kind.startswith("WITH"):
+        return "WITH"
+    return kind if kind in STATEMENT_KINDS else "OTHER"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware без BaseHTTPMiddleware: не создаёт задач и не оборачивает тело ответа."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Шаблон пути (/api/recipes/{recipe_id}), а не сам путь - иначе у каждого id свой ряд
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            REQUEST_LATENCY.labels(scope["method"], path).observe(time.perf_counter() - started)
+            REQUESTS.labels(scope["method"], path, str(status)).inc()
+
+
+def instrument_engine(engine):
+    # COPY в ingest идёт мимо SQLAlchemy и здесь не учитывается
+    # Время начала - на контексте выполнения, а не на соединении: если запрос упал
+    # (statement_timeout, нарушение ограничения), after_cursor_execute не вызывается, и контекст просто уходит
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_LATENCY.labels(statement_kind(statement)).observe(time.perf_counter() - context.query_started)
+
+
+class StatsCollector:
+    """Готовые stats() модулей как метрики Prometheus; вызывается только при опросе."""
+
+    def __init__(self, prefix: str, sources: Dict[str, Callable[[], dict]], counters=()):
+        self.prefix = prefix
+        self.sources = sources
+        self.counters = set(counters)
+
+    def collect(self):
+        for source, stats in self.sources.items():
+            for name, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric_name = f"{self.prefix}_{source}_{name}"
+                if name in self.counters:
+                    family = CounterMetricFamily(metric_name, f"{source}: {name}")
+                else:
+                    family = GaugeMetricFamily(metric_name, f"{source}: {name}")
+                family.add_metric([], value)
+                yield family
+
+
+def register_stats(prefix: str, sources: Dict[str, Callable[[], dict]], counters=()):
+    REGISTRY.register(StatsCollector(prefix, sources, counters))
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,37 @@
+"""create recipes
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Базы, созданные раньше через create_all, уже содержат таблицу
+    if sa.inspect(op.get_bind()).has_table("recipes"):
+        return
+    op.create_table(
+        "recipes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(200), nullable=False),
+        sa.Column("ingredients", postgresql.ARRAY(sa.String())),
+        sa.Column("instructions", sa.Text()),
+        sa.Column("cooking_time", sa.Integer()),
+        sa.Column("difficulty", sa.String(20)),
+    )
+    op.create_index("ix_recipes_id", "recipes", ["id"])
+
+
+def downgrade():
+    op.drop_index("ix_recipes_id", table_name="recipes")
+    op.drop_table("recipes")
@@ -0,0 +1,34 @@
+"""search indexes for recipes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_recipes_ingredients_gin", "recipes", ["ingredients"],
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "ix_recipes_title_trgm", "recipes", [sa.text("lower(title) gin_trgm_ops")],
+        postgresql_using="gin",
+    )
+    op.create_index("ix_recipes_difficulty_time", "recipes", ["difficulty", "cooking_time"])
+
+
+def downgrade():
+    op.drop_index("ix_recipes_difficulty_time", table_name="recipes")
+    op.drop_index("ix_recipes_title_trgm", table_name="recipes")
+    op.drop_index("ix_recipes_ingredients_gin", table_name="recipes")
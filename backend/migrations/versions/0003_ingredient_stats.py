@@ -0,0 +1,87 @@
+"""ingredient stats counter table
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ingredient_stats",
+        sa.Column("ingredient", sa.String(), primary_key=True),
+        sa.Column("recipe_count", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_ingredient_stats_recipe_count", "ingredient_stats", ["recipe_count"])
+
+    # Счётчики поддерживаются триггерами на уровне оператора: один пересчёт на INSERT/COPY,
+    # а не на каждую строку. Таблицы переходов нельзя объявить для нескольких событий сразу,
+    # поэтому триггеров три, функция одна.
+    op.execute("""
+        CREATE FUNCTION ingredient_stats_refresh() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                UPDATE ingredient_stats s
+                SET recipe_count = s.recipe_count - d.cnt
+                FROM (
+                    SELECT ingredient, count(*) AS cnt
+                    FROM (SELECT DISTINCT o.id, unnest(o.ingredients) AS ingredient FROM old_rows o) x
+                    GROUP BY ingredient
+                ) d
+                WHERE s.ingredient = d.ingredient;
+                DELETE FROM ingredient_stats WHERE recipe_count <= 0;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO ingredient_stats (ingredient, recipe_count)
+                SELECT ingredient, count(*)
+                FROM (SELECT DISTINCT n.id, unnest(n.ingredients) AS ingredient FROM new_rows n) x
+                GROUP BY ingredient
+                ORDER BY ingredient
+                ON CONFLICT (ingredient)
+                DO UPDATE SET recipe_count = ingredient_stats.recipe_count + EXCLUDED.recipe_count;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER recipes_ingredient_stats_insert
+        AFTER INSERT ON recipes REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_stats_refresh()
+    """)
+    op.execute("""
+        CREATE TRIGGER recipes_ingredient_stats_delete
+        AFTER DELETE ON recipes REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_stats_refresh()
+    """)
+    op.execute("""
+        CREATE TRIGGER recipes_ingredient_stats_update
+        AFTER UPDATE ON recipes REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_stats_refresh()
+    """)
+
+    op.execute("""
+        INSERT INTO ingredient_stats (ingredient, recipe_count)
+        SELECT ingredient, count(*)
+        FROM (SELECT DISTINCT r.id, unnest(r.ingredients) AS ingredient FROM recipes r) x
+        GROUP BY ingredient
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER recipes_ingredient_stats_update ON recipes")
+    op.execute("DROP TRIGGER recipes_ingredient_stats_delete ON recipes")
+    op.execute("DROP TRIGGER recipes_ingredient_stats_insert ON recipes")
+    op.execute("DROP FUNCTION ingredient_stats_refresh()")
+    op.drop_index("ix_ingredient_stats_recipe_count", table_name="ingredient_stats")
+    op.drop_table("ingredient_stats")
@@ -0,0 +1,171 @@
+"""ingredient dictionary with synonyms and recipe_ingredients junction
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# Канонический ингредиент -> другие написания, которые к нему приводятся.
+# Группы взяты из рецептов и подписей классов в imagenet_classes.json.
+SYNONYMS = {
+    "курица": ["куриное филе", "куриная грудка", "куриный фарш", "куриные крылышки", "крылышки", "кура"],
+    "яйцо": ["яйца", "куриное яйцо", "куриные яйца"],
+    "огурец": ["огурцы", "свежий огурец"],
+    "помидоры": ["помидор", "томат", "томаты"],
+    "картофель": ["картошка", "картофелина"],
+    "морковь": ["морковка"],
+    "яблоко": ["яблоки"],
+    "лимон": ["лимоны"],
+    "кабачок": ["кабачки", "цукини"],
+    "грибы": ["гриб", "шампиньоны"],
+    "баклажаны": ["баклажан"],
+    "капуста пекинская": ["пекинская капуста"],
+    "перец болгарский": ["болгарский перец", "сладкий перец"],
+    "лук зеленый": ["зеленый лук"],
+    "лук красный": ["красный лук"],
+    "сухари панировочные": ["панировочные сухари"],
+    "масло растительное": ["масло подсолнечное", "подсолнечное масло", "растительное масло"],
+    "масло оливковое": ["оливковое масло"],
+    "масло сливочное": ["сливочное масло"],
+    "сыр пармезан": ["пармезан"],
+    "сыр фета": ["фета"],
+    "фарш мясной": ["мясной фарш", "фарш"],
+}
+
+
+def upgrade():
+    # То же правило, что normalize_ingredient() в ingredient_dictionary.py
+    op.execute("""
+        CREATE FUNCTION normalize_ingredient(name text) RETURNS text
+        LANGUAGE sql IMMUTABLE AS $$
+            SELECT replace(lower(btrim(regexp_replace(name, '\\s+', ' ', 'g'))), 'ё', 'е')
+        $$
+    """)
+
+    op.create_table(
+        "ingredients",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+    )
+    op.create_table(
+        "ingredient_synonyms",
+        sa.Column("synonym", sa.String(), primary_key=True),
+        sa.Column("ingredient_id", sa.Integer(), sa.ForeignKey("ingredients.id", ondelete="CASCADE"), nullable=False),
+    )
+    op.create_index("ix_ingredient_synonyms_ingredient_id", "ingredient_synonyms", ["ingredient_id"])
+    op.create_table(
+        "recipe_ingredients",
+        sa.Column("recipe_id", sa.Integer(), sa.ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ingredient_id", sa.Integer(), sa.ForeignKey("ingredients.id"), primary_key=True),
+    )
+    op.create_index("ix_recipe_ingredients_ingredient", "recipe_ingredients", ["ingredient_id", "recipe_id"])
+
+    conn = op.get_bind()
+    for name, synonyms in SYNONYMS.items():
+        ingredient_id = conn.execute(
+            sa.text("INSERT INTO ingredients (name) VALUES (:name) RETURNING id"), {"name": name}
+        ).scalar()
+        conn.execute(
+            sa.text("INSERT INTO ingredient_synonyms (synonym, ingredient_id) VALUES (:synonym, :id)"),
+            [{"synonym": synonym, "id": ingredient_id} for synonym in [name] + synonyms],
+        )
+
+    # Неизвестное написание становится новым каноническим ингредиентом, синоним к нему - оно само.
+    # Связи при DELETE удаляет ON DELETE CASCADE, триггеры нужны только на INSERT и UPDATE.
+    op.execute("""
+        CREATE FUNCTION recipe_ingredients_refresh() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+                DELETE FROM recipe_ingredients ri USING new_rows n WHERE ri.recipe_id = n.id;
+            END IF;
+            -- regexp в normalize_ingredient дорогой: считаем его по разу на каждое различное написание,
+            -- а не на каждую пару рецепт-ингредиент
+            WITH names AS (
+                SELECT DISTINCT normalize_ingredient(r.raw) AS name
+                FROM (SELECT DISTINCT i.name AS raw FROM new_rows n CROSS JOIN LATERAL unnest(n.ingredients) AS i(name)) r
+            ), added AS (
+                INSERT INTO ingredients (name)
+                SELECT name FROM names
+                WHERE name <> ''
+                  AND NOT EXISTS (SELECT 1 FROM ingredient_synonyms s WHERE s.synonym = names.name)
+                ORDER BY name
+                ON CONFLICT (name) DO NOTHING
+                RETURNING id, name
+            )
+            INSERT INTO ingredient_synonyms (synonym, ingredient_id)
+            SELECT name, id FROM added
+            ON CONFLICT (synonym) DO NOTHING;
+
+            INSERT INTO recipe_ingredients (recipe_id, ingredient_id)
+            SELECT DISTINCT n.id, m.ingredient_id
+            FROM new_rows n
+            CROSS JOIN LATERAL unnest(n.ingredients) AS i(name)
+            JOIN (
+                SELECT r.raw, s.ingredient_id
+                FROM (SELECT DISTINCT i.name AS raw FROM new_rows n CROSS JOIN LATERAL unnest(n.ingredients) AS i(name)) r
+                JOIN ingredient_synonyms s ON s.synonym = normalize_ingredient(r.raw)
+            ) m ON m.raw = i.name
+            ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER recipes_ingredients_insert
+        AFTER INSERT ON recipes REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION recipe_ingredients_refresh()
+    """)
+    op.execute("""
+        CREATE TRIGGER recipes_ingredients_update
+        AFTER UPDATE ON recipes REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION recipe_ingredients_refresh()
+    """)
+
+    op.execute("""
+        WITH names AS (
+            SELECT DISTINCT normalize_ingredient(r.raw) AS name
+            FROM (SELECT DISTINCT i.name AS raw FROM recipes r CROSS JOIN LATERAL unnest(r.ingredients) AS i(name)) r
+        ), added AS (
+            INSERT INTO ingredients (name)
+            SELECT name FROM names
+            WHERE name <> ''
+              AND NOT EXISTS (SELECT 1 FROM ingredient_synonyms s WHERE s.synonym = names.name)
+            ORDER BY name
+            RETURNING id, name
+        )
+        INSERT INTO ingredient_synonyms (synonym, ingredient_id)
+        SELECT name, id FROM added
+    """)
+    op.execute("""
+        INSERT INTO recipe_ingredients (recipe_id, ingredient_id)
+        SELECT DISTINCT r.id, m.ingredient_id
+        FROM recipes r
+        CROSS JOIN LATERAL unnest(r.ingredients) AS i(name)
+        JOIN (
+            SELECT d.raw, s.ingredient_id
+            FROM (SELECT DISTINCT i.name AS raw FROM recipes r CROSS JOIN LATERAL unnest(r.ingredients) AS i(name)) d
+            JOIN ingredient_synonyms s ON s.synonym = normalize_ingredient(d.raw)
+        ) m ON m.raw = i.name
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER recipes_ingredients_update ON recipes")
+    op.execute("DROP TRIGGER recipes_ingredients_insert ON recipes")
+    op.execute("DROP FUNCTION recipe_ingredients_refresh()")
+    op.drop_index("ix_recipe_ingredients_ingredient", table_name="recipe_ingredients")
+    op.drop_table("recipe_ingredients")
+    op.drop_index("ix_ingredient_synonyms_ingredient_id", table_name="ingredient_synonyms")
+    op.drop_table("ingredient_synonyms")
+    op.drop_table("ingredients")
+    op.execute("DROP FUNCTION normalize_ingredient(text)")
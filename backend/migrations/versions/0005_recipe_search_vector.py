@@ -0,0 +1,56 @@
+"""full-text search vector for recipes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("recipes", sa.Column("search_vector", TSVECTOR()))
+
+    # Вычисляемый столбец не подходит: array_to_string не IMMUTABLE. Поэтому строковый
+    # BEFORE-триггер - он срабатывает и на INSERT, и на COPY из массовой загрузки.
+    op.execute("""
+        CREATE FUNCTION recipe_search_vector(title text, ingredients varchar[], instructions text)
+        RETURNS tsvector LANGUAGE sql STABLE AS $$
+            SELECT setweight(to_tsvector('russian', coalesce(title, '')), 'A')
+                || setweight(to_tsvector('russian', coalesce(array_to_string(ingredients, ' '), '')), 'B')
+                || setweight(to_tsvector('russian', coalesce(instructions, '')), 'C')
+        $$
+    """)
+    op.execute("""
+        CREATE FUNCTION recipes_search_vector_refresh() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.search_vector := recipe_search_vector(NEW.title, NEW.ingredients, NEW.instructions);
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER recipes_search_vector
+        BEFORE INSERT OR UPDATE OF title, ingredients, instructions ON recipes
+        FOR EACH ROW EXECUTE FUNCTION recipes_search_vector_refresh()
+    """)
+
+    op.execute("UPDATE recipes SET search_vector = recipe_search_vector(title, ingredients, instructions)")
+    op.create_index("ix_recipes_search_vector", "recipes", ["search_vector"], postgresql_using="gin")
+
+
+def downgrade():
+    op.drop_index("ix_recipes_search_vector", table_name="recipes")
+    op.execute("DROP TRIGGER recipes_search_vector ON recipes")
+    op.execute("DROP FUNCTION recipes_search_vector_refresh()")
+    op.execute("DROP FUNCTION recipe_search_vector(text, varchar[], text)")
+    op.drop_column("recipes", "search_vector")
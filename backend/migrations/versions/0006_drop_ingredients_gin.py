@@ -0,0 +1,24 @@
+"""drop the GIN index on recipes.ingredients
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Поиск по ингредиентам идёт через recipe_ingredients (0004), оператор && больше не используется,
+    # а индекс обновлялся бы при каждой вставке и COPY
+    op.drop_index("ix_recipes_ingredients_gin", table_name="recipes")
+
+
+def downgrade():
+    op.create_index("ix_recipes_ingredients_gin", "recipes", ["ingredients"], postgresql_using="gin")
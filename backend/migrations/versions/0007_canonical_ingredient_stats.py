@@ -0,0 +1,140 @@
+"""count ingredient stats by canonical ingredient
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+# Счётчики из 0003, по сырым строкам recipes.ingredients - для downgrade
+RAW_STATS_FUNCTION = """
+    CREATE FUNCTION ingredient_stats_refresh() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            UPDATE ingredient_stats s
+            SET recipe_count = s.recipe_count - d.cnt
+            FROM (
+                SELECT ingredient, count(*) AS cnt
+                FROM (SELECT DISTINCT o.id, unnest(o.ingredients) AS ingredient FROM old_rows o) x
+                GROUP BY ingredient
+            ) d
+            WHERE s.ingredient = d.ingredient;
+            DELETE FROM ingredient_stats WHERE recipe_count <= 0;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO ingredient_stats (ingredient, recipe_count)
+            SELECT ingredient, count(*)
+            FROM (SELECT DISTINCT n.id, unnest(n.ingredients) AS ingredient FROM new_rows n) x
+            GROUP BY ingredient
+            ORDER BY ingredient
+            ON CONFLICT (ingredient)
+            DO UPDATE SET recipe_count = ingredient_stats.recipe_count + EXCLUDED.recipe_count;
+        END IF;
+        RETURN NULL;
+    END
+    $$
+"""
+
+
+def upgrade():
+    # "Томат", "томаты" и "помидор" - один ингредиент: считаем по recipe_ingredients,
+    # куда написания уже сведены триггерами из 0004
+    op.execute("DROP TRIGGER recipes_ingredient_stats_update ON recipes")
+    op.execute("DROP TRIGGER recipes_ingredient_stats_delete ON recipes")
+    op.execute("DROP TRIGGER recipes_ingredient_stats_insert ON recipes")
+    op.execute("DROP FUNCTION ingredient_stats_refresh()")
+    op.drop_index("ix_ingredient_stats_recipe_count", table_name="ingredient_stats")
+    op.drop_table("ingredient_stats")
+
+    op.create_table(
+        "ingredient_stats",
+        sa.Column("ingredient_id", sa.Integer(), sa.ForeignKey("ingredients.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("recipe_count", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_ingredient_stats_recipe_count", "ingredient_stats", ["recipe_count"])
+
+    # UPDATE рецепта пересобирает его связи через DELETE + INSERT, DELETE рецепта доходит сюда
+    # через ON DELETE CASCADE, так что триггеров на recipe_ingredients достаточно двух
+    op.execute("""
+        CREATE FUNCTION ingredient_stats_refresh() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE ingredient_stats s
+                SET recipe_count = s.recipe_count - d.cnt
+                FROM (SELECT ingredient_id, count(*) AS cnt FROM old_rows GROUP BY ingredient_id) d
+                WHERE s.ingredient_id = d.ingredient_id;
+                DELETE FROM ingredient_stats WHERE recipe_count <= 0;
+            ELSE
+                INSERT INTO ingredient_stats (ingredient_id, recipe_count)
+                SELECT ingredient_id, count(*) FROM new_rows
+                GROUP BY ingredient_id
+                ORDER BY ingredient_id
+                ON CONFLICT (ingredient_id)
+                DO UPDATE SET recipe_count = ingredient_stats.recipe_count + EXCLUDED.recipe_count;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER recipe_ingredients_stats_insert
+        AFTER INSERT ON recipe_ingredients REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_stats_refresh()
+    """)
+    op.execute("""
+        CREATE TRIGGER recipe_ingredients_stats_delete
+        AFTER DELETE ON recipe_ingredients REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_stats_refresh()
+    """)
+
+    op.execute("""
+        INSERT INTO ingredient_stats (ingredient_id, recipe_count)
+        SELECT ingredient_id, count(*) FROM recipe_ingredients GROUP BY ingredient_id
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER recipe_ingredients_stats_delete ON recipe_ingredients")
+    op.execute("DROP TRIGGER recipe_ingredients_stats_insert ON recipe_ingredients")
+    op.execute("DROP FUNCTION ingredient_stats_refresh()")
+    op.drop_index("ix_ingredient_stats_recipe_count", table_name="ingredient_stats")
+    op.drop_table("ingredient_stats")
+
+    op.create_table(
+        "ingredient_stats",
+        sa.Column("ingredient", sa.String(), primary_key=True),
+        sa.Column("recipe_count", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_ingredient_stats_recipe_count", "ingredient_stats", ["recipe_count"])
+    op.execute(RAW_STATS_FUNCTION)
+    op.execute("""
+        CREATE TRIGGER recipes_ingredient_stats_insert
+        AFTER INSERT ON recipes REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_stats_refresh()
+    """)
+    op.execute("""
+        CREATE TRIGGER recipes_ingredient_stats_delete
+        AFTER DELETE ON recipes REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_stats_refresh()
+    """)
+    op.execute("""
+        CREATE TRIGGER recipes_ingredient_stats_update
+        AFTER UPDATE ON recipes REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_stats_refresh()
+    """)
+    op.execute("""
+        INSERT INTO ingredient_stats (ingredient, recipe_count)
+        SELECT ingredient, count(*)
+        FROM (SELECT DISTINCT r.id, unnest(r.ingredients) AS ingredient FROM recipes r) x
+        GROUP BY ingredient
+    """)
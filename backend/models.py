@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import Column, ForeignKey, Integer, String, Text, Index, text
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred
 from database import Base
 
 class RecipeDB(Base):
@@ -10,4 +11,47 @@ class RecipeDB(Base):
     ingredients = Column(ARRAY(String))
     instructions = Column(Text)
     cooking_time = Column(Integer)
-    difficulty = Column(String(20))
\ No newline at end of file
+    difficulty = Column(String(20))
+    # Заполняется триггером из миграции 0005; deferred - чтобы не попадал в ответы API
+    search_vector = deferred(Column(TSVECTOR))
+
+    __table_args__ = (
+        Index("ix_recipes_title_trgm", text("lower(title) gin_trgm_ops"), postgresql_using="gin"),
+        Index("ix_recipes_difficulty_time", "difficulty", "cooking_time"),
+        Index("ix_recipes_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+
+class IngredientStatDB(Base):
+    # Заполняется триггерами из миграции 0007 по recipe_ingredients, приложение только читает
+    __tablename__ = "ingredient_stats"
+
+    ingredient_id = Column(Integer, ForeignKey("ingredients.id", ondelete="CASCADE"), primary_key=True)
+    recipe_count = Column(Integer, nullable=False, index=True)
+
+
+class IngredientDB(Base):
+    __tablename__ = "ingredients"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+
+class IngredientSynonymDB(Base):
+    # Каждое известное написание (включая само каноническое имя) -> id ингредиента
+    __tablename__ = "ingredient_synonyms"
+
+    synonym = Column(String, primary_key=True)
+    ingredient_id = Column(Integer, ForeignKey("ingredients.id", ondelete="CASCADE"), nullable=False, index=True)
+
+
+class RecipeIngredientDB(Base):
+    # Заполняется триггерами из миграции 0004 по recipes.ingredients
+    __tablename__ = "recipe_ingredients"
+
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    ingredient_id = Column(Integer, ForeignKey("ingredients.id"), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_recipe_ingredients_ingredient", "ingredient_id", "recipe_id"),
+    )
@@ -0,0 +1,209 @@
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Дельта вливается в основную матрицу, когда в ней больше стольких рецептов (или 5% корпуса)
+MERGE_MIN_ROWS = 10000
+
+
+class RecipeMatch(NamedTuple):
+    recipe_id: int
+    matched: int
+    coverage: float
+
+    @property
+    def sort_key(self) -> Tuple[int, float, int]:
+        # Больше совпадений -> выше, при равенстве -> большая доля покрытых ингредиентов
+        return -self.matched, -self.coverage, self.recipe_id
+
+
+class PantryMatch(NamedTuple):
+    recipe_id: int
+    matched: int
+    missing: int
+    coverage: float
+
+    @property
+    def sort_key(self) -> Tuple[float, int, int, int]:
+        # Сначала доля ингредиентов рецепта, которые уже есть, потом сколько докупать
+        return -self.coverage, self.missing, -self.matched, self.recipe_id
+
+
+class PantryIndex:
+    """Разреженная матрица рецепт x ингредиент для поиска по ингредиентам (режимы any и pantry).
+
+    Основная часть хранится по столбцам (CSC): для каждого id ингредиента - номера строк-рецептов.
+    Произведение матрицы на вектор кладовой тогда - bincount по столбцам из кладовой, и его
+    стоимость зависит от длины этих столбцов, а не от размера всего корпуса. Новые рецепты
+    копятся в небольшой построчной дельте и вливаются в основную часть пачками.
+
+    Индекс живёт в памяти процесса и пополняется только тем воркером, который принял рецепт,
+    поэтому API запускается одним воркером uvicorn.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._difficulty_codes: Dict[Optional[str], int] = {None: 0}
+        self._pending: List[tuple] = []
+        self._reset()
+
+    def _reset(self):
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._sizes = np.zeros(0, dtype=np.int32)
+        self._times = np.zeros(0, dtype=np.int32)
+        self._difficulties = np.zeros(0, dtype=np.int8)
+        self._col_ptr = np.zeros(1, dtype=np.int64)
+        self._col_rows = np.zeros(0, dtype=np.int32)
+        self._delta_rows = np.zeros(0, dtype=np.int32)
+        self._delta_indices = np.zeros(0, dtype=np.int32)
+        self._delta_count = 0
+
+    def __len__(self):
+        return len(self._ids) + len(self._pending)
+
+    def _difficulty_code(self, difficulty: Optional[str]) -> int:
+        return self._difficulty_codes.setdefault(difficulty, len(self._difficulty_codes))
+
+    def add(self, recipe_id: int, ingredient_ids: Optional[Iterable[int]],
+            cooking_time: Optional[int] = None, difficulty: Optional[str] = None):
+        with self._lock:
+            self._pending.append((recipe_id, sorted(set(ingredient_ids or ())), cooking_time, difficulty))
+
+    def build(self, rows):
+        with self._lock:
+            self._reset()
+            self._pending = [
+                (row.id, sorted(set(row.ingredient_ids or ())), row.cooking_time, row.difficulty) for row in rows
+            ]
+            self._flush()
+            self._merge()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        count = len(pending)
+        first_row = len(self._ids)
+        sizes = np.fromiter((len(ids) for _, ids, _, _ in pending), dtype=np.int32, count=count)
+        self._ids = np.concatenate([self._ids, np.fromiter((p[0] for p in pending), dtype=np.int64, count=count)])
+        self._sizes = np.concatenate([self._sizes, sizes])
+        # Время None никогда не проходит фильтр max_time: рецепт без времени не считается быстрым
+        self._times = np.concatenate([self._times, np.fromiter(
+            (t if t is not None else np.iinfo(np.int32).max for _, _, t, _ in pending), dtype=np.int32, count=count
+        )])
+        self._difficulties = np.concatenate([self._difficulties, np.fromiter(
+            (self._difficulty_code(d) for _, _, _, d in pending), dtype=np.int8, count=count
+        )])
+        self._delta_indices = np.concatenate([self._delta_indices, np.fromiter(
+            (ingredient_id for _, ids, _, _ in pending for ingredient_id in ids), dtype=np.int32, count=int(sizes.sum())
+        )])
+        self._delta_rows = np.concatenate([
+            self._delta_rows, np.repeat(np.arange(first_row, first_row + count, dtype=np.int32), sizes)
+        ])
+        self._delta_count += count
+        if self._delta_count > max(MERGE_MIN_ROWS, len(self._ids) // 20):
+            self._merge()
+
+    def _merge(self):
+        columns = len(self._col_ptr) - 1
+        ingredients = np.concatenate([
+            np.repeat(np.arange(columns, dtype=np.int32), np.diff(self._col_ptr)),
+            self._delta_indices,
+        ])
+        rows = np.concatenate([self._col_rows, self._delta_rows])
+        self._col_rows = rows[np.argsort(ingredients, kind="stable")]
+        self._col_ptr = np.concatenate([[0], np.cumsum(np.bincount(ingredients), dtype=np.int64)])
+        self._delta_rows = np.zeros(0, dtype=np.int32)
+        self._delta_indices = np.zeros(0, dtype=np.int32)
+        self._delta_count = 0
+
+    def _matched(self, pantry_ids: np.ndarray, col_ptr, col_rows, delta_rows, delta_indices, rows: int):
+        # Матрица x вектор кладовой: сколько ингредиентов каждого рецепта есть у пользователя
+        columns = [col_rows[col_ptr[i]:col_ptr[i + 1]] for i in pantry_ids if i < len(col_ptr) - 1]
+        matched = np.bincount(np.concatenate(columns), minlength=rows) if columns else np.zeros(rows, dtype=np.int64)
+        if len(delta_rows):
+            matched += np.bincount(delta_rows[np.isin(delta_indices, pantry_ids)], minlength=rows)
+        return matched
+
+    def _snapshot(self):
+        with self._lock:
+            self._flush()
+            # Массивы только заменяются целиком, поэтому дальше можно считать без блокировки
+            return (self._ids, self._sizes, self._times, self._difficulties, self._col_ptr, self._col_rows,
+                    self._delta_rows, self._delta_indices, self._difficulty_codes)
+
+    def _score(self, ingredient_ids: Iterable[int], max_time: Optional[int], difficulty: Optional[str]):
+        """Совпадения, размеры и маска фильтров по всем рецептам; None - заведомо пусто."""
+        ids, sizes, times, difficulties, col_ptr, col_rows, delta_rows, delta_indices, codes = self._snapshot()
+        pantry_ids = np.fromiter(set(ingredient_ids), dtype=np.int64)
+        if not len(ids) or not len(pantry_ids):
+            return None
+        matched = self._matched(pantry_ids, col_ptr, col_rows, delta_rows, delta_indices, len(ids))
+        mask = matched > 0
+        if max_time:
+            mask &= times <= max_time
+        if difficulty:
+            difficulty_code = codes.get(difficulty)
+            if difficulty_code is None:
+                return None
+            mask &= difficulties == difficulty_code
+        return ids, sizes, matched, mask
+
+    @staticmethod
+    def _top(candidates: np.ndarray, score: np.ndarray, limit: Optional[int]) -> np.ndarray:
+        # argpartition отбирает порог за O(n); равные порогу оставляем, чтобы порядок был точным
+        if limit and len(candidates) > limit:
+            top = np.argpartition(-score[candidates], limit - 1)[:limit]
+            threshold = score[candidates[top]].min()
+            candidates = candidates[score[candidates] >= threshold]
+        return candidates
+
+    def rank_any(self, ingredient_ids: Iterable[int], max_time: Optional[int] = None,
+                 difficulty: Optional[str] = None, limit: Optional[int] = None,
+                 after: Optional[tuple] = None) -> List[RecipeMatch]:
+        """Рецепты, где есть хоть один ингредиент: по числу совпадений, потом по доле."""
+        scored = self._score(ingredient_ids, max_time, difficulty)
+        if scored is None:
+            return []
+        ids, sizes, matched, mask = scored
+        coverage = matched / np.maximum(sizes, 1)
+        if after is not None:
+            # Keyset-пагинация по (-matched, -coverage, id), векторно
+            a_matched, a_coverage, a_id = after
+            h, c = -matched, -coverage
+            mask &= (h > a_matched) | ((h == a_matched) & ((c > a_coverage) | ((c == a_coverage) & (ids > a_id))))
+
+        candidates = self._top(np.flatnonzero(mask), matched, limit)
+        order = np.lexsort((ids[candidates], -coverage[candidates], -matched[candidates]))
+        candidates = candidates[order][:limit or None]
+        return [RecipeMatch(int(ids[i]), int(matched[i]), float(coverage[i])) for i in candidates]
+
+    def rank(self, ingredient_ids: Iterable[int], max_time: Optional[int] = None,
+             difficulty: Optional[str] = None, limit: Optional[int] = None,
+             after: Optional[tuple] = None, max_missing: Optional[int] = None) -> List[PantryMatch]:
+        """Рецепты по доле ингредиентов, которые уже есть, потом по числу недостающих."""
+        scored = self._score(ingredient_ids, max_time, difficulty)
+        if scored is None:
+            return []
+        ids, sizes, matched, mask = scored
+        missing = sizes - matched
+        coverage = matched / np.maximum(sizes, 1)
+        if max_missing is not None:
+            mask &= missing <= max_missing
+        if after is not None:
+            # Keyset-пагинация по (-coverage, missing, -matched, id), векторно
+            a_coverage, a_missing, a_matched, a_id = after
+            c, m, h = -coverage, missing, -matched
+            mask &= (c > a_coverage) | ((c == a_coverage) & (
+                (m > a_missing) | ((m == a_missing) & ((h > a_matched) | ((h == a_matched) & (ids > a_id))))
+            ))
+
+        candidates = self._top(np.flatnonzero(mask), coverage, limit)
+        order = np.lexsort((ids[candidates], -matched[candidates], missing[candidates], -coverage[candidates]))
+        candidates = candidates[order][:limit or None]
+        return [
+            PantryMatch(int(ids[i]), int(matched[i]), int(missing[i]), float(coverage[i])) for i in candidates
+        ]
+
+pantry_index = PantryIndex()
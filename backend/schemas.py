@@ -0,0 +1,21 @@
+from typing import List
+from pydantic import BaseModel
+
+
+class RecipeBase(BaseModel):
+    title: str
+    ingredients: List[str]
+    instructions: str
+    cooking_time: int
+    difficulty: str
+
+
+class RecipeCreate(RecipeBase):
+    pass
+
+
+class Recipe(RecipeBase):
+    id: int
+
+    class Config:
+        orm_mode = True
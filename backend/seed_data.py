@@ -3,13 +3,12 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy.orm import Session
-from database import engine, SessionLocal
+import asyncio
+from database import SessionLocal, async_engine
+from ingest import ingest_recipes
 import models
 
 
-models.Base.metadata.create_all(bind=engine)
-
 RECIPES_DATA = [
     {
         "title": "Курица с картошкой в духовке",
@@ -378,6 +377,14 @@ RECIPES_DATA = [
         "difficulty": "medium"
     }
 ]
+async def load_recipes(recipes):
+    try:
+        # Тот же путь через COPY, что и у POST /api/recipes/bulk
+        return await ingest_recipes(recipes, chunk_size=10)
+    finally:
+        await async_engine.dispose()
+
+
 def seed_database():
     db = SessionLocal()
 
@@ -397,13 +404,12 @@ def seed_database():
             db.commit()
 
         print(f"➕ Добавляем {len(RECIPES_DATA)} рецептов...")
-        for i, recipe_data in enumerate(RECIPES_DATA, 1):
-            recipe = models.RecipeDB(**recipe_data)
-            db.add(recipe)
-            if i % 10 == 0:  # Прогресс каждые 10 рецептов
-                print(f"   Прогресс: {i}/{len(RECIPES_DATA)}")
-
-        db.commit()
+        report = asyncio.run(load_recipes(RECIPES_DATA))
+        for chunk in report["chunks"]:
+            for error in chunk["errors"]:
+                print(f"⚠️ Рецепт #{error['row']} пропущен: {error['error']}")
+            if "error" in chunk:
+                print(f"❌ Пакет {chunk['chunk']} не загружен: {chunk['error']}")
 
 
         final_count = db.query(models.RecipeDB).count()
@@ -0,0 +1,177 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from ingredient_dictionary import normalize_ingredient
+
+# Дельта вливается в основные массивы, когда в ней больше стольких ключей (или 5% основного массива)
+MERGE_MIN_KEYS = 10000
+# Больше любого символа: все ключи, начинающиеся с prefix, лежат в [prefix, prefix + PREFIX_END)
+PREFIX_END = chr(0x10FFFF)
+# Ключ слова - номер названия и смещение слова в нём; название не длиннее String(200), смещение влезает в байт
+WORD_SHIFT = 8
+WORD_MASK = (1 << WORD_SHIFT) - 1
+
+
+def prefix_range(keys, prefix: str, key: Callable) -> Tuple[int, int]:
+    return bisect_left(keys, prefix, key=key), bisect_left(keys, prefix + PREFIX_END, key=key)
+
+
+class SortedKeys:
+    """Отсортированный массив номеров и маленькая отсортированная дельта к нему.
+
+    Вставка в дельту - insort по короткому списку; в основной массив дельта вливается
+    линейным слиянием, а не пересортировкой, и только когда разрастётся.
+    """
+
+    def __init__(self, key: Callable):
+        self.key = key
+        self.main = array("q")
+        self.delta: List[int] = []
+
+    def build(self, items: Iterable[int]):
+        self.main = array("q", sorted(items, key=self.key))
+        self.delta = []
+
+    def add(self, item: int):
+        insort(self.delta, item, key=self.key)
+        if len(self.delta) > max(MERGE_MIN_KEYS, len(self.main) // 20):
+            self.main = array("q", heapq.merge(self.main, self.delta, key=self.key))
+            self.delta = []
+
+    def starting_with(self, prefix: str):
+        """Номера с ключом, начинающимся с prefix, по возрастанию ключа; лениво."""
+        parts = []
+        for keys in (self.main, self.delta):
+            lo, hi = prefix_range(keys, prefix, self.key)
+            parts.append(map(keys.__getitem__, range(lo, hi)))
+        return heapq.merge(*parts, key=self.key)
+
+
+class SuggestIndex:
+    """Автодополнение по префиксу: отсортированные массивы ключей и bisect.
+
+    Ингредиенты ищутся по всем написаниям из словаря синонимов, а возвращаются каноническим
+    именем и ранжируются по числу рецептов. Названия ищутся с начала названия и с начала
+    любого слова в нём; строки хранятся один раз, в отсортированных массивах - только номера.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # (написание, id ингредиента)
+        self._ingredient_keys: List[Tuple[str, int]] = []
+        self._ingredient_names: Dict[int, str] = {}
+        self._canonical_keys: Dict[int, str] = {}
+        self._ingredient_counts: Dict[int, int] = {}
+        # Нормализованные названия и как их показывать; номер названия - позиция в списке
+        self._titles: List[str] = []
+        self._display_titles: List[str] = []
+        self._title_counts: List[int] = []
+        self._title_numbers: Dict[str, int] = {}
+        self._title_keys = SortedKeys(self._title_key)
+        self._word_keys = SortedKeys(self._word_key)
+
+    def _title_key(self, number: int) -> str:
+        return self._titles[number]
+
+    def _word_key(self, key: int) -> str:
+        return self._titles[key >> WORD_SHIFT][key & WORD_MASK:]
+
+    @staticmethod
+    def _word_starts(number: int, key: str) -> Iterable[int]:
+        offset = key.find(" ")
+        while offset != -1 and offset < WORD_MASK:
+            yield number << WORD_SHIFT | offset + 1
+            offset = key.find(" ", offset + 1)
+
+    def _add_ingredient(self, ingredient_id: int, name: str, synonyms: Iterable[str] = ()):
+        if ingredient_id not in self._ingredient_names:
+            self._ingredient_names[ingredient_id] = name
+            self._canonical_keys[ingredient_id] = normalize_ingredient(name)
+            self._ingredient_counts.setdefault(ingredient_id, 0)
+        # Написаний - тысячи, а не сотни тысяч: хватает insort в обычный список
+        for synonym in {normalize_ingredient(s) for s in [name, *synonyms]}:
+            insort(self._ingredient_keys, (synonym, ingredient_id))
+
+    def _add_recipe(self, title: str, ingredients: Iterable[Tuple[int, str]], insert_keys: bool = True):
+        for ingredient_id, name in ingredients:
+            if ingredient_id not in self._ingredient_names:
+                self._add_ingredient(ingredient_id, name)
+            self._ingredient_counts[ingredient_id] += 1
+        key = normalize_ingredient(title or "")
+        if not key:
+            return
+        number = self._title_numbers.get(key)
+        if number is None:
+            number = self._title_numbers[key] = len(self._titles)
+            self._titles.append(key)
+            self._display_titles.append(title.strip())
+            self._title_counts.append(0)
+            if insert_keys:
+                self._title_keys.add(number)
+                for word_key in self._word_starts(number, key):
+                    self._word_keys.add(word_key)
+        self._title_counts[number] += 1
+
+    def add_recipe(self, title: str, ingredients: Iterable[Tuple[int, str]]):
+        """ingredients - пары (id, каноническое имя) из словаря ингредиентов."""
+        with self._lock:
+            self._add_recipe(title, ingredients)
+
+    def build(self, titles: Iterable[str], ingredient_ids: Iterable[Iterable[int]], names: Dict[int, str],
+              synonyms: Iterable[Tuple[str, int]]):
+        with self._lock:
+            self._reset()
+            by_id: Dict[int, List[str]] = {}
+            for synonym, ingredient_id in synonyms:
+                by_id.setdefault(ingredient_id, []).append(synonym)
+            for ingredient_id, name in names.items():
+                self._add_ingredient(ingredient_id, name, by_id.get(ingredient_id, ()))
+            for title, ids in zip(titles, ingredient_ids):
+                self._add_recipe(title, [(i, names.get(i, "")) for i in ids or ()], insert_keys=False)
+            # Ключи названий сортируются один раз в конце, а не вставляются по одному
+            self._title_keys.build(range(len(self._titles)))
+            self._word_keys.build(
+                word_key for number, key in enumerate(self._titles) for word_key in self._word_starts(number, key)
+            )
+
+    def suggest_ingredients(self, prefix: str, limit: int = 10) -> List[dict]:
+        prefix = normalize_ingredient(prefix)
+        # Пустой префикс (одни пробелы) совпал бы со всем словарём
+        if not prefix:
+            return []
+        with self._lock:
+            lo, hi = prefix_range(self._ingredient_keys, prefix, itemgetter(0))
+            ids = {self._ingredient_keys[j][1] for j in range(lo, hi)}
+            counts, names, canonical = self._ingredient_counts, self._ingredient_names, self._canonical_keys
+            # Совпавшие по каноническому имени - выше совпавших только по синониму («кур» -> курица, а не
+            # яйцо через «куриное яйцо»). Ингредиенты без рецептов не подсказываем: поиск по ним пуст
+            best = heapq.nsmallest(limit, (i for i in ids if counts[i]), key=lambda i: (
+                not canonical[i].startswith(prefix), -counts[i], names[i]
+            ))
+            return [{"text": names[i], "count": counts[i]} for i in best]
+
+    def suggest_titles(self, prefix: str, limit: int = 10) -> List[dict]:
+        prefix = normalize_ingredient(prefix)
+        if not prefix:
+            return []
+        numbers: List[int] = []
+        with self._lock:
+            # Сначала названия, которые начинаются с prefix, потом - где с него начинается слово;
+            # внутри - по алфавиту, поэтому хватает первых limit ключей диапазона
+            for keys, shift in ((self._title_keys, 0), (self._word_keys, WORD_SHIFT)):
+                for key in keys.starting_with(prefix):
+                    if len(numbers) >= limit:
+                        break
+                    if key >> shift not in numbers:
+                        numbers.append(key >> shift)
+            return [{"text": self._display_titles[n], "count": self._title_counts[n]} for n in numbers]
+
+
+suggest_index = SuggestIndex()
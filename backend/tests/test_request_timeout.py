@@ -0,0 +1,64 @@
+"""RequestTimeoutMiddleware: по таймауту клиент получает 503, а обработчик отменяется."""
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from main import RequestTimeoutMiddleware
+
+
+def make_client(events: list) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        events.append("finished")
+        return {"ok": True}
+
+    @app.get("/exempt")
+    async def exempt():
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def rows():
+            for i in range(3):
+                await asyncio.sleep(0.1)
+                yield f"{i}\n"
+        return StreamingResponse(rows())
+
+    @app.get("/own-timeout")
+    async def own_timeout():
+        raise TimeoutError("upstream")
+
+    app.add_middleware(RequestTimeoutMiddleware, timeout=0.1, exempt_paths=("/exempt",))
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_slow_handler_is_cancelled():
+    events = []
+    response = make_client(events).get("/slow")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert events == ["cancelled"]
+
+
+def test_exempt_path_is_not_limited():
+    assert make_client([]).get("/exempt").status_code == 200
+
+
+def test_streaming_body_is_not_cut():
+    response = make_client([]).get("/stream")
+    assert response.status_code == 200
+    assert response.text == "0\n1\n2\n"
+
+
+def test_handler_timeout_error_is_not_a_503():
+    assert make_client([]).get("/own-timeout").status_code == 500
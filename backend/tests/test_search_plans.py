@@ -0,0 +1,92 @@
+"""Каждая форма поискового запроса API может идти по индексу.
+
+Нужна база с применёнными миграциями (alembic upgrade head), адрес - DATABASE_URL;
+без неё тесты пропускаются. Запуск из backend/: python -m pytest
+
+На маленькой базе планировщик справедливо выбирает seqscan, поэтому он выключается:
+тест проверяет, что выражение запроса совпадает с индексом и план с ним существует.
+"""
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+import models
+from database import engine
+from main import filtered_query, fulltext_query, has_any_ingredient, recipe_columns, title_filter
+
+
+@pytest.fixture(scope="module")
+def connection():
+    try:
+        conn = engine.connect()
+    except OperationalError as e:
+        pytest.skip(f"Postgres недоступен: {e}")
+    migrated = conn.execute(text("SELECT to_regclass('recipe_ingredients')")).scalar() is not None
+    conn.rollback()
+    if not migrated:
+        conn.close()
+        pytest.skip("миграции не применены")
+    yield conn
+    conn.close()
+
+
+def explain(connection, query) -> str:
+    compiled = query.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    # SET LOCAL действует до конца транзакции, rollback возвращает настройку
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = "\n".join(connection.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).scalars())
+    connection.rollback()
+    return plan
+
+
+SEARCH_SHAPES = {
+    # ingredients=... : кандидаты из recipe_ingredients по id ингредиента
+    "ingredients": (
+        lambda: select(*recipe_columns("summary")).where(has_any_ingredient([1, 2, 3])),
+        "ix_recipe_ingredients_ingredient", None,
+    ),
+    # title=... и /api/search/title/{title_part}: LIKE '%...%' по lower(title)
+    "title": (
+        lambda: select(*recipe_columns("summary")).where(title_filter("суп")),
+        "ix_recipes_title_trgm", "pg_trgm",
+    ),
+    # q=... : полнотекстовый поиск
+    "fulltext": (
+        lambda: fulltext_query("курица с картошкой", None, None, None, "summary"),
+        "ix_recipes_search_vector", None,
+    ),
+    # difficulty=...&max_time=... без ингредиентов
+    "filters": (
+        lambda: filtered_query(None, 30, "легко", "summary").limit(20),
+        "ix_recipes_difficulty_time", None,
+    ),
+    # Страница ранжированной выдачи: строки по id из индекса в памяти
+    "ranked_page": (
+        lambda: select(*recipe_columns("summary")).where(models.RecipeDB.id.in_([1, 2, 3])),
+        "recipes_pkey", None,
+    ),
+    # Keyset-пагинация /api/recipes
+    "keyset": (
+        lambda: select(*recipe_columns("summary")).where(models.RecipeDB.id > 100)
+        .order_by(models.RecipeDB.id).limit(20),
+        "recipes_pkey", None,
+    ),
+    # /api/stats/ingredients
+    "ingredient_stats": (
+        lambda: select(models.IngredientDB.name, models.IngredientStatDB.recipe_count)
+        .join(models.IngredientDB, models.IngredientDB.id == models.IngredientStatDB.ingredient_id)
+        .order_by(models.IngredientStatDB.recipe_count.desc(), models.IngredientDB.name).limit(10),
+        "ix_ingredient_stats_recipe_count", None,
+    ),
+}
+
+
+@pytest.mark.parametrize("shape", SEARCH_SHAPES)
+def test_search_uses_index(connection, shape):
+    build_query, index, extension = SEARCH_SHAPES[shape]
+    if extension and not connection.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = :name"), {"name": extension}
+    ).scalar():
+        pytest.skip(f"в этой сборке Postgres нет расширения {extension}")
+    plan = explain(connection, build_query())
+    assert index in plan, plan
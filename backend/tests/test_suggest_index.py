@@ -0,0 +1,30 @@
+"""Автодополнение по индексу в памяти, без базы."""
+import pytest
+
+from suggest_index import SuggestIndex
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex()
+    index.build(
+        ["Курица с картошкой", "Суп куриный", "Омлет"],
+        [[1, 2], [1], [3]],
+        {1: "курица", 2: "картофель", 3: "яйцо"},
+        [("куриное филе", 1), ("картошка", 2), ("куриное яйцо", 3)],
+    )
+    return index
+
+
+def test_ingredients_by_prefix(index):
+    assert index.suggest_ingredients("кур") == [{"text": "курица", "count": 2}, {"text": "яйцо", "count": 1}]
+
+
+def test_titles_by_word_start(index):
+    assert [s["text"] for s in index.suggest_titles("кур")] == ["Курица с картошкой", "Суп куриный"]
+
+
+@pytest.mark.parametrize("prefix", [" ", "   ", "\t"])
+def test_blank_prefix_suggests_nothing(index, prefix):
+    assert index.suggest_ingredients(prefix) == []
+    assert index.suggest_titles(prefix) == []
@@ -2,14 +2,15 @@ from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
 from aiogram.types import Message, BotCommand, BotCommandScopeDefault
 from aiogram.enums import ParseMode
-import requests
+import aiohttp
+from aiohttp import web
 import asyncio
 import os
-import io
-import json
-import torch
-from torchvision import models, transforms
-from PIL import Image
+import time
+from typing import Optional
+from sessions import create_session_store, recipe_summary
+from photo_cache import MISS, content_key, create_classification_cache, telegram_key
+from metrics import CLASSIFY_LATENCY, register_stats, render_metrics
 INGREDIENT_TRANSLATION = {
     "banana": "банан",
     "broccoli": "брокколи",
@@ -21,93 +22,187 @@ INGREDIENT_TRANSLATION = {
 dp = Dispatcher()
 token = os.getenv("BOT_TOKEN")
 API_URL = os.getenv("API_URL", "http://localhost:8000")
-def load_ml_model():
-    model = models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1)
-    model.eval()
-    with open('imagenet_classes.json') as f:
-        idx_to_class = json.load(f)
-    return model, idx_to_class
-preprocess = transforms.Compose([
-    transforms.Resize(256),
-    transforms.CenterCrop(224),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
-def classify_image(image: Image.Image, model, idx_to_class):
-    img_tensor = preprocess(image).unsqueeze(0)
-    with torch.no_grad():
-        output = model(img_tensor)
-    probabilities = torch.nn.functional.softmax(output[0], dim=0)
-    top_prob, top_catid = torch.topk(probabilities, 1)
-    class_id = top_catid[0].item()
-    class_info = idx_to_class[str(class_id)]
-    return class_info[1].strip()
-model, idx_to_class = load_ml_model()
+MAX_RESULTS = int(os.getenv("SESSION_MAX_RESULTS", "30"))
+sessions = create_session_store()
+photo_cache = create_classification_cache()
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
+# Первое фото может ждать загрузки модели в backend
+CLASSIFY_TIMEOUT = float(os.getenv("CLASSIFY_TIMEOUT", "30"))
+MIN_PHOTO_SIDE = 256
+register_stats(
+    "cookwizard_bot",
+    {"photo_cache": photo_cache.stats},
+    counters=("memory_hits", "disk_hits", "misses"),
+)
+# multi - всегда искать несколько продуктов на фото; иначе только по подписи /multi
+PHOTO_MODE = os.getenv("PHOTO_MODE", "single")
 class Api:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, timeout: float = 5, retries: int = 2, backoff: float = 0.3, pool_size: int = 100):
         self.base_url = base_url
-    async def search_recipe_by_ingredients(self, ingredients: str):
-        try:
-            param = {"ingredients": ingredients}
-            responce = requests.get(f"{self.base_url}/api/search", timeout=5, params=param)
-            return responce.json()
-        except requests.exceptions.RequestException as e:
-            print(e)
-            raise 
-    async def Search_recipe_by_name(self, name: str):
-        try:
-            param = {"title": name}
-            responce = requests.get(f"{self.base_url}/api/search", params=param)
-            return responce.json()
-        except requests.exceptions.RequestException as e:
-            print(e)
-            raise 
-    async def Search_recipe_by_time(self, time: int):
-        try:
-            param = {"max_time": time}
-            responce = requests.get(f"{self.base_url}/api/search", params=param)
-            return responce.json()
-        except requests.exceptions.RequestException as e:
-            print(e)
-            raise 
-    async def Search_recipe_by_difficulty(self, diff: str):
-        try:
-            param = {"difficulty": diff}
-            responce = requests.get(f"{self.base_url}/api/search", params=param)
-            return responce.json()
-        except requests.exceptions.RequestException as e:
-            print(e)
-            raise 
-api = Api(API_URL)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Одна сессия на весь бот: keep-alive и пул соединений к backend
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def _get(self, path: str, params: dict = None, timeout: float = None):
+        return await self._request("GET", path, params, timeout=timeout)
+
+    async def _request(self, method: str, path: str, params: dict = None, data: bytes = None, timeout: float = None):
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        # timeout=None в request() отключил бы таймаут совсем: без своего значения действует ClientTimeout сессии
+        request_options = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._get_session().request(method, f"{self.base_url}{path}", params=params, data=data,
+                                                       **request_options) as responce:
+                    responce.raise_for_status()
+                    return await responce.json()
+            except aiohttp.ClientResponseError as e:
+                if e.status < 500 or attempt == self.retries:
+                    print(e)
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    print(e)
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def search(self, timeout: float = None, **params):
+        return await self._get("/api/search", params, timeout=timeout)
+
+    async def suggest(self, prefix: str, kind: str = "ingredient", limit: int = 3, timeout: float = None):
+        return await self._get("/api/suggest", {"prefix": prefix, "kind": kind, "limit": limit}, timeout=timeout)
+
+    async def get_recipe(self, recipe_id: int, timeout: float = None):
+        return await self._get(f"/api/recipes/{recipe_id}", timeout=timeout)
+
+    async def classify(self, image_bytes: bytes, multi: bool = False, top_k: int = 5, timeout: float = None):
+        # Распознаёт общая модель backend: своей копии ResNet18 и torch у бота нет
+        params = {"multi": "true" if multi else "false", "top_k": top_k}
+        return (await self._request("POST", "/api/classify", params, data=image_bytes, timeout=timeout))["labels"]
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+api = Api(API_URL, timeout=float(os.getenv("API_TIMEOUT", "5")))
 bot = Bot(token)
+
+
+async def answer_recipes(message: Message, recipes: list, not_found: str = "🔍❌По вашему запросу ничего не найдено"):
+    if not recipes:
+        await message.answer(not_found)
+        return
+    answer = "🍳 Найденные рецепты:\n\n"
+    for i, rec in enumerate(recipes, 1):
+        answer += f"{i}. {rec['title']} ({rec['cooking_time']} мин.)\n"
+    answer += "\n📝 Для просмотра рецепта введите его номер:"
+    await message.answer(answer)
+    await sessions.set(message.chat.id, [recipe_summary(rec) for rec in recipes])
+
+
+async def suggest_spellings(items: list, kind: str) -> list:
+    # Для каждого введённого слова - самые частые написания с тем же началом (или хотя бы первыми буквами)
+    async def suggest_one(item: str) -> list:
+        for prefix in (item, item[:3]):
+            found = await api.suggest(prefix=prefix, kind=kind)
+            if found:
+                return [s["text"] for s in found]
+        return []
+    suggestions = []
+    for found in await asyncio.gather(*(suggest_one(item) for item in items if item)):
+        suggestions += [text for text in found if text not in suggestions]
+    return suggestions
+
+
+async def answer_or_suggest(message: Message, recipes: list, items: list, kind: str):
+    if not recipes:
+        suggestions = await suggest_spellings(items, kind)
+        if suggestions:
+            await message.answer("🔍❌По вашему запросу ничего не найдено\nВозможно, вы имели в виду: " + ", ".join(suggestions))
+            return
+    await answer_recipes(message, recipes)
+
+
+def pick_photo_size(sizes: list, min_side: int = MIN_PHOTO_SIDE):
+    """Самый маленький вариант фото, у которого меньшая сторона не меньше min_side.
+
+    Telegram присылает размеры по возрастанию; модели нужно 256 px, а не оригинал.
+    """
+    for size in sorted(sizes, key=lambda s: s.width * s.height):
+        if min(size.width, size.height) >= min_side:
+            return size
+    return max(sizes, key=lambda s: s.width * s.height)
+
+
+def wants_multi(message: Message) -> bool:
+    return PHOTO_MODE == "multi" or (message.caption or "").strip().lower().startswith("/multi")
+
+
+async def recognize_photo(message: Message, photo, multi: bool = False) -> Optional[str]:
+    suffix = ":multi" if multi else ""
+    # Пересланное фото узнаём по file_unique_id без скачивания и без модели
+    tg_key = telegram_key(photo.file_unique_id) + suffix
+    product_name = await photo_cache.get(tg_key)
+    if product_name is not MISS:
+        print("Лог: фото уже распознавалось, результат из кэша")
+        return product_name
+    print(f"Лог: выбран размер {photo.width}x{photo.height}, {photo.file_size} байт")
+    photo_file = await message.bot.get_file(photo.file_id)
+    photo_bytes = (await message.bot.download_file(photo_file.file_path)).read()
+    # То же изображение, загруженное заново, получает новый file_unique_id, но тот же хеш
+    image_key = await asyncio.get_running_loop().run_in_executor(None, content_key, photo_bytes) + suffix
+    product_name = await photo_cache.get(image_key)
+    if product_name is MISS:
+        started = time.perf_counter()
+        try:
+            labels = await api.classify(photo_bytes, multi=multi, timeout=CLASSIFY_TIMEOUT)
+        except aiohttp.ClientResponseError as e:
+            if e.status != 400:
+                raise
+            # Битое фото не кэшируем: та же картинка, присланная заново, может оказаться целой
+            return None
+        CLASSIFY_LATENCY.labels("multi" if multi else "single").observe(time.perf_counter() - started)
+        # Пустой ответ - на фото не продукт. Без multi ищем по самому вероятному продукту,
+        # с multi все найденные уходят одним поиском, как список ингредиентов через запятую
+        if not multi:
+            labels = labels[:1]
+        product_name = ", ".join(", ".join(label["ingredients"]) or label["label"] for label in labels) or None
+        photo_cache.set(image_key, product_name)
+    photo_cache.set(tg_key, product_name)
+    return product_name
+
+
 @dp.message(F.photo)
 async def handle_photo_search(message: Message):
     print("Лог: Получено фото для анализа")
-    photo_file = await message.bot.get_file(message.photo[-1].file_id)
-    photo_bytes = await message.bot.download_file(photo_file.file_path)
-    image = Image.open(io.BytesIO(photo_bytes.read()))
-    product_name = classify_image(image, model, idx_to_class)
+    photo = pick_photo_size(message.photo)
+    product_name = await recognize_photo(message, photo, multi=wants_multi(message))
+    if product_name is None:
+        await message.answer("Не удалось распознать продукт на фото. Попробуйте другое фото.")
+        return
     product_name_ru = INGREDIENT_TRANSLATION.get(
         product_name.lower(),
         product_name
     )
     await message.answer(f"Я вижу на фото: <b>{product_name_ru}</b>\nИщу рецепты...", parse_mode=ParseMode.HTML)
-    recipe = await api.search_recipe_by_ingredients(product_name_ru)
-    if recipe:
-        answer = "🍳 Найденные рецепты:\n\n"
-        for i, rec in enumerate(recipe, 1):
-            answer += f"{i}. {rec['title']} ({rec['cooking_time']} мин.)\n"
-        answer += "\n📝 Для просмотра рецепта введите его номер:"
-        await message.answer(answer)
-        dp.current_user_data = recipe
-    else:
-        await message.answer("Ничего не найдено по этому продукту.")
+    recipe = await api.search(ingredients=product_name_ru, view="summary", limit=MAX_RESULTS)
+    await answer_recipes(message, recipe, not_found="Ничего не найдено по этому продукту.")
 @dp.message(Command("start"))
 async def start(message: types.Message):
     await message.answer("Привет! Я CookWizard бот\nВведите /help для отображения всех возможных команд")
 @dp.message(Command("help"))
 async def help_cmd(message: Message):
-    text = "<b>Список команд бота:</b>\n/start, /help, /name, /product, /time, /diff\nИли просто пришли мне ФОТО ингредиента!"
+    text = "<b>Список команд бота:</b>\n/start, /help, /name, /product, /time, /diff\nИли просто пришли мне ФОТО ингредиента!\nФото с подписью /multi - поиск по всем продуктам на снимке"
     await message.answer(text, parse_mode=ParseMode.HTML)
 @dp.message(Command("name"))
 async def search_name(message: Message):
@@ -116,16 +211,9 @@ async def search_name(message: Message):
         await message.answer("Использование: /name <название блюда>")
         return
     full_query = " ".join(name)
-    recipe = await api.Search_recipe_by_name(full_query)
-    if recipe:
-        answer = "🍳 Найденные рецепты:\n\n"
-        for i, rec in enumerate(recipe, 1):
-            answer += f"{i}. {rec['title']} ({rec['cooking_time']} мин.)\n"
-        answer += "\n📝 Для просмотра рецепта введите его номер:"
-        await message.answer(answer)
-        dp.current_user_data = recipe
-    else:
-        await message.answer("🔍❌По вашему запросу ничего не найдено")
+    # Полнотекстовый поиск: находит и «курицей», и «курица», лучшие совпадения по названию - первыми
+    recipe = await api.search(q=full_query, view="summary", limit=MAX_RESULTS)
+    await answer_or_suggest(message, recipe, [full_query], "title")
 
 
 @dp.message(Command("product"))
@@ -135,16 +223,8 @@ async def search_prod(message: Message):
         await message.answer("Использование: /product <ингредиент1>, <ингредиент2>...")
         return
     full = "".join(name)
-    recipe = await api.search_recipe_by_ingredients(full)
-    if recipe:
-        answer = "🍳 Найденные рецепты:\n\n"
-        for i, rec in enumerate(recipe, 1):
-            answer += f"{i}. {rec['title']} ({rec['cooking_time']} мин.)\n"
-        answer += "\n📝 Для просмотра рецепта введите его номер:"
-        await message.answer(answer)
-        dp.current_user_data = recipe
-    else:
-        await message.answer("🔍❌По вашему запросу ничего не найдено")
+    recipe = await api.search(ingredients=full, view="summary", limit=MAX_RESULTS)
+    await answer_or_suggest(message, recipe, [i.strip() for i in full.split(",")], "ingredient")
 
 @dp.message(Command("diff"))
 async def search_diff(message: Message):
@@ -152,40 +232,30 @@ async def search_diff(message: Message):
     if not name:
         await message.answer("Использование: /diff <easy/medium/hard>")
         return
-    recipe = await api.Search_recipe_by_difficulty(name[0])
-    if recipe:
-        answer = "🍳 Найденные рецепты:\n\n"
-        for i, rec in enumerate(recipe, 1):
-            answer += f"{i}. {rec['title']} ({rec['cooking_time']} мин.)\n"
-        answer += "\n📝 Для просмотра рецепта введите его номер:"
-        await message.answer(answer)
-        dp.current_user_data = recipe
-    else:
-        await message.answer("🔍❌По вашему запросу ничего не найдено")
+    recipe = await api.search(difficulty=name[0], view="summary", limit=MAX_RESULTS)
+    await answer_recipes(message, recipe)
 
 @dp.message(Command("time"))
 async def search_time(message: Message):
     time_args = message.text.split()[1:]
     if time_args and time_args[0].isdigit():
-        recipe = await api.Search_recipe_by_time(int(time_args[0]))
-        if recipe:
-            answer = "🍳 Найденные рецепты:\n\n"
-            for i, rec in enumerate(recipe, 1):
-                answer += f"{i}. {rec['title']} ({rec['cooking_time']} мин.)\n"
-            answer += "\n📝 Для просмотра рецепта введите его номер:"
-            await message.answer(answer)
-            dp.current_user_data = recipe
-        else:
-            await message.answer("🔍❌По вашему запросу ничего не найдено")
+        recipe = await api.search(max_time=int(time_args[0]), view="summary", limit=MAX_RESULTS)
+        await answer_recipes(message, recipe)
 
 
 @dp.message(lambda message: message.text.isdigit())
 async def select_recipe(message: Message):
-    if hasattr(dp, 'current_user_data'):
-        recipes = dp.current_user_data
+    recipes = await sessions.get(message.chat.id)
+    if recipes:
         number = int(message.text)
         if 1 <= number <= len(recipes):
-            recipe = recipes[number - 1]
+            try:
+                recipe = await api.get_recipe(recipes[number - 1]["id"])
+            except aiohttp.ClientResponseError as e:
+                if e.status != 404:
+                    raise
+                await message.answer("❌ Рецепт больше недоступен")
+                return
             ingr = ", ".join(recipe['ingredients'])
             text = f"<b>{recipe['title']}</b>\n\n🎯Сложность: {recipe['difficulty']}\n⏱️Время: {recipe['cooking_time']} мин\n🥬Ингредиенты: {ingr}\n📋Инструкция:\n{recipe['instructions']}"
             await message.answer(text, parse_mode=ParseMode.HTML)
@@ -207,9 +277,37 @@ async def set_default_commands(bot: Bot):
     await bot.set_my_commands(commands, BotCommandScopeDefault())
 
 
+async def health(request: web.Request):
+    return web.json_response({
+        "status": "healthy",
+        "photo_cache": photo_cache.stats(),
+    })
+
+
+async def metrics(request: web.Request):
+    body, content_type = render_metrics()
+    # aiohttp не принимает charset внутри content_type, отдаём заголовок целиком
+    return web.Response(body=body, headers={"Content-Type": content_type})
+
+
+async def start_health_server() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", HEALTH_PORT).start()
+    return runner
+
+
 async def main():
     await set_default_commands(bot)
-    await dp.start_polling(bot)
+    health_runner = await start_health_server()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await api.close()
+        await health_runner.cleanup()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,40 @@
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Задержка - от скачанного фото до ответа /api/classify, включая ожидание в очереди батча backend
+CLASSIFY_LATENCY = Histogram(
+    "cookwizard_bot_classify_duration_seconds", "Время распознавания фото", ["mode"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+class StatsCollector:
+    """stats() кэша фото как метрики Prometheus; вызывается только при опросе."""
+
+    def __init__(self, prefix: str, sources: Dict[str, Callable[[], dict]], counters=()):
+        self.prefix = prefix
+        self.sources = sources
+        self.counters = set(counters)
+
+    def collect(self):
+        for source, stats in self.sources.items():
+            for name, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric_name = f"{self.prefix}_{source}_{name}"
+                if name in self.counters:
+                    family = CounterMetricFamily(metric_name, f"{source}: {name}")
+                else:
+                    family = GaugeMetricFamily(metric_name, f"{source}: {name}")
+                family.add_metric([], value)
+                yield family
+
+
+def register_stats(prefix: str, sources: Dict[str, Callable[[], dict]], counters=()):
+    REGISTRY.register(StatsCollector(prefix, sources, counters))
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
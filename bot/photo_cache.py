@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# Отдельный маркер промаха: None - тоже валидный ответ («на фото не продукт»)
+MISS = object()
+
+
+def telegram_key(file_unique_id: str) -> str:
+    # file_unique_id одинаков у пересланных копий одного файла и не зависит от бота
+    return f"tg:{file_unique_id}"
+
+
+def content_key(data: bytes) -> str:
+    """Ключ по содержимому: dHash 8x8 для изображений, sha256 - если PIL не смог их открыть или хеш вырожден.
+
+    Пережатые при повторной загрузке копии дают другой sha256, но тот же dHash.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.draft("L", (64, 64))
+        pixels = list(image.convert("L").resize((9, 8), Image.BILINEAR).getdata())
+    except Exception:
+        pixels = None
+    bits = 0
+    if pixels is not None:
+        for row in range(8):
+            for col in range(8):
+                bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    # Однотонные и монотонные картинки дают вырожденный хеш, общий для совсем разных фото
+    if pixels is None or bits in (0, 2 ** 64 - 1):
+        return f"sha256:{hashlib.sha256(data).hexdigest()}"
+    return f"dhash:{bits:016x}"
+
+
+class ClassificationCache:
+    """Метка по ключу фото: LRU в памяти + необязательный слой в SQLite, переживающий рестарт.
+
+    SQLite работает в отдельном потоке: чтение с диска ожидается через executor, запись уходит
+    в фон, и event loop бота не ждёт диск. Поток один, поэтому чтение видит все записи до него.
+    """
+
+    def __init__(self, max_size: int = 10000, path: Optional[str] = None):
+        self.max_size = max_size
+        self.path = path
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_executor = None
+        if path:
+            self._disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="photo_cache")
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS labels (key TEXT PRIMARY KEY, label TEXT, created_at REAL)"
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, label: Optional[str]):
+        self._data[key] = label
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def _disk_get(self, key: str):
+        row = self._db.execute("SELECT label FROM labels WHERE key = ?", (key,)).fetchone()
+        return MISS if row is None else row[0]
+
+    def _disk_set(self, key: str, label: Optional[str]):
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO labels (key, label, created_at) VALUES (?, ?, ?)",
+                (key, label, time.time()),
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Лог: не удалось сохранить метку фото на диск: {e}")
+
+    async def get(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.memory_hits += 1
+                return self._data[key]
+        label = MISS
+        if self._db is not None:
+            label = await asyncio.get_running_loop().run_in_executor(self._disk_executor, self._disk_get, key)
+        with self._lock:
+            if label is MISS:
+                self.misses += 1
+            else:
+                self._remember(key, label)
+                self.disk_hits += 1
+        return label
+
+    def set(self, key: str, label: Optional[str]):
+        with self._lock:
+            self._remember(key, label)
+        if self._db is not None:
+            self._disk_executor.submit(self._disk_set, key, label)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "size": len(self._data),
+            "disk": self.path,
+        }
+
+
+def create_classification_cache() -> ClassificationCache:
+    return ClassificationCache(
+        max_size=int(os.getenv("PHOTO_CACHE_SIZE", "10000")),
+        path=os.getenv("PHOTO_CACHE_PATH") or None,
+    )
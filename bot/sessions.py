@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+
+def recipe_summary(recipe: dict) -> dict:
+    # В сессии храним только то, что нужно для выбора по номеру; полный рецепт берётся из API по id
+    return {"id": recipe["id"], "title": recipe["title"], "cooking_time": recipe.get("cooking_time")}
+
+
+class InMemorySessionStore:
+    """Результаты последнего поиска по chat id: LRU + TTL, не больше max_chats чатов."""
+
+    def __init__(self, max_chats: int = 10000, ttl: float = 3600):
+        self.max_chats = max_chats
+        self.ttl = ttl
+        self._data: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, chat_id: int) -> Optional[List[dict]]:
+        with self._lock:
+            item = self._data.get(chat_id)
+            if item is None:
+                return None
+            expires_at, results = item
+            if expires_at < time.monotonic():
+                del self._data[chat_id]
+                return None
+            self._data.move_to_end(chat_id)
+            return results
+
+    async def set(self, chat_id: int, results: List[dict]):
+        with self._lock:
+            self._data[chat_id] = (time.monotonic() + self.ttl, results)
+            self._data.move_to_end(chat_id)
+            while len(self._data) > self.max_chats:
+                self._data.popitem(last=False)
+
+
+class RedisSessionStore:
+    """Общее хранилище для нескольких реплик бота; вытеснение - TTL ключа и политика памяти Redis."""
+
+    def __init__(self, url: str, ttl: float = 3600, prefix: str = "cookwizard:chat:"):
+        import redis.asyncio as redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+
+    async def get(self, chat_id: int) -> Optional[List[dict]]:
+        raw = await self._redis.get(f"{self.prefix}{chat_id}")
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, chat_id: int, results: List[dict]):
+        await self._redis.set(f"{self.prefix}{chat_id}", json.dumps(results, ensure_ascii=False), ex=int(self.ttl))
+
+
+def create_session_store():
+    ttl = float(os.getenv("SESSION_TTL", "3600"))
+    url = os.getenv("SESSION_STORE_URL")
+    if url:
+        return RedisSessionStore(url, ttl=ttl)
+    return InMemorySessionStore(max_chats=int(os.getenv("SESSION_MAX_CHATS", "10000")), ttl=ttl)
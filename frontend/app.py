@@ -1,73 +1,112 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Optional
-from collections import Counter
 import altair as alt
 from datetime import datetime
-import torch
-from torchvision import models, transforms
-from PIL import Image
-import json
-@st.cache_resource
-def load_ml_model():
-    model=models.resnet18(weights=models.ResNet18_Weights.IMAGENET1K_V1)
-    model.eval()
-    try:
-        with open('imagenet_classes.json') as f:
-            idx_to_class=json.load(f)
-    except FileNotFoundError:
-        st.warning("Файл 'imagenet_classes.json' не найден. Распознавание будет использовать только индексы.")
-        idx_to_class=None
-    return model, idx_to_class
-preprocess = transforms.Compose([
-    transforms.Resize(256),
-    transforms.CenterCrop(224),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
-def classify_image(image: Image.Image, model, idx_to_class, top_k=5) -> List[str]:
-    img_tensor=preprocess(image)
-    img_tensor=img_tensor.unsqueeze(0)
-    with torch.no_grad():
-        output=model(img_tensor)
-    probabilities=torch.nn.functional.softmax(output[0], dim=0)
-    top_prob, top_catid=torch.topk(probabilities, top_k)
-    recognized_items = []
-    for i in range(top_k):
-        class_id=top_catid[i].item()
-        if idx_to_class:
-            class_name=idx_to_class[str(class_id)].split(',')[0].strip()
-        else:
-            class_name=f"Object_{class_id}"
-
-        recognized_items.append(class_name)
-    return recognized_items
+import os
+import threading
 api_base_url = "http://backend:8000"
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "5"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "60"))
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", "300"))
 st.set_page_config(layout="wide")
 st.title("CookWizard: Мастер Рецептов")
 st.markdown("---")
-@st.cache_data
-def get_all_recipes_data() -> List[str]:
-    try:
-        response = requests.get(f"{api_base_url}/api/recipes")
-        response.raise_for_status()
-        recipes_data = response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Не удалось получить данные для статистики: {e}")
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    # Одна сессия на процесс: keep-alive и общий пул соединений к backend для всех пользователей
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=int(os.getenv("API_POOL_SIZE", "32")))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=int(os.getenv("API_WORKERS", "8")), thread_name_prefix="api")
+def api_request(path: str, params: Optional[dict] = None, timeout: float = API_TIMEOUT) -> requests.Response:
+    response = get_http_session().get(f"{api_base_url}{path}", params=params, timeout=timeout)
+    response.raise_for_status()
+    return response
+def api_get(path: str, params: Optional[dict] = None, timeout: float = API_TIMEOUT):
+    return api_request(path, params, timeout).json()
+def submit(fn, *args) -> Future:
+    # Независимые запросы к backend идут параллельно; потоку нужен контекст сессии, иначе кэш Streamlit ругается
+    ctx = get_script_run_ctx()
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return get_executor().submit(run)
+# Ошибки наружу, а не пустой результат: st.cache_data не кэширует исключения, и сбой backend не залипает на TTL
+@st.cache_data(ttl=SEARCH_CACHE_TTL, show_spinner=False)
+def search_page(params: dict, limit: int, cursor: Optional[str] = None) -> dict:
+    # В списке только summary; следующая страница - по курсору из заголовка X-Next-Cursor
+    response = api_request("/api/search", {**params, "view": "summary", "limit": limit, "cursor": cursor})
+    return {"items": response.json(), "next_cursor": response.headers.get("X-Next-Cursor")}
+@st.cache_data(ttl=SEARCH_CACHE_TTL, show_spinner=False)
+def get_recipe(recipe_id: int) -> dict:
+    return api_get(f"/api/recipes/{recipe_id}")
+@st.cache_data(ttl=STATS_CACHE_TTL, show_spinner=False)
+def get_ingredient_stats(top_n: int = 30) -> List[tuple]:
+    stats = api_get("/api/stats/ingredients", {"limit": top_n})
+    return [(item["ingredient"], item["count"]) for item in stats]
+@st.cache_data(ttl=SEARCH_CACHE_TTL, show_spinner=False)
+def fetch_suggestions(prefix: str, kind: str, limit: int = 5) -> List[str]:
+    return [item["text"] for item in api_get("/api/suggest", {"prefix": prefix, "kind": kind, "limit": limit}, timeout=1)]
+def get_suggestions(prefix: str, kind: str, limit: int = 5) -> List[str]:
+    # /api/suggest отвечает из памяти; при ошибке просто не показываем подсказки
+    if len(prefix.strip()) < 2:
         return []
-    if not recipes_data:
+    try:
+        return fetch_suggestions(prefix.strip(), kind, limit)
+    except requests.exceptions.RequestException:
         return []
-    all_ingredients = []
-    for recipe in recipes_data:
-        if isinstance(recipe.get('ingredients'), list):
-            all_ingredients.extend(recipe.get('ingredients'))
-
-    return all_ingredients
+PAGE_SIZES = [10, 20, 50]
+DIFFICULTY_DISPLAY = {"easy": "легко", "medium": "средне", "hard": "сложно"}
+def change_page(step: int, next_cursor: Optional[str] = None):
+    search = st.session_state.search
+    if step > 0:
+        search["cursors"] = search["cursors"][:search["page"] + 1] + [next_cursor]
+    search["page"] += step
+def reset_pages():
+    if st.session_state.get("search"):
+        st.session_state.search.update(cursors=[None], page=0)
+def show_recipe_body(recipe_id: int):
+    try:
+        recipe = get_recipe(recipe_id)
+    except requests.exceptions.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+        st.warning("❌ Рецепт больше недоступен")
+        return
+    st.markdown("**Ингредиенты:**")
+    for ingredient in recipe['ingredients'][:10]:
+        st.markdown(f"- {ingredient}")
+    if len(recipe['ingredients']) > 10:
+        st.caption(f"... и ещё {len(recipe['ingredients']) - 10} ингредиентов")
+    st.text_area(
+        "Инструкции",
+        value=recipe.get('instructions') or 'Инструкции отсутствуют.',
+        height=150,
+        disabled=True,
+        key=f"instructions_{recipe_id}"
+    )
+def show_suggestions(placeholder, future: Future):
+    suggestions = future.result()
+    if suggestions:
+        placeholder.caption("Подсказки: " + ", ".join(suggestions))
 
 
 if 'search_history' not in st.session_state:
     st.session_state.search_history = []
+if 'opened_recipes' not in st.session_state:
+    st.session_state.opened_recipes = set()
+
+# Статистика нужна вкладке 2, но запрашивается сразу - параллельно с поиском и подсказками вкладки 1
+stats_future = submit(get_ingredient_stats, 30)
 
 tab1, tab2, tab3 = st.tabs([" Найти рецепты", "📊 Статистика", "📜 История поисков"])
 
@@ -78,6 +117,7 @@ with tab1:
         ["Ингредиентам", "Названию рецепта", "Ингредиентам и названию"],
         horizontal=True
     )
+    hints = []
 
 
     if search_type in ["Ингредиентам", "Ингредиентам и названию"]:
@@ -86,6 +126,7 @@ with tab1:
             value="",
             placeholder="например: курица, картофель, морковь"
         )
+        hints.append((st.empty(), submit(get_suggestions, user_ingredients.split(",")[-1], "ingredient")))
     else:
         user_ingredients = ""
 
@@ -95,8 +136,12 @@ with tab1:
             value="",
             placeholder="например: курица с картофелем"
         )
+        hints.append((st.empty(), submit(get_suggestions, recipe_title, "title")))
     else:
         recipe_title = ""
+    # Подсказки к обоим полям запрошены параллельно, выводятся под своими полями
+    for placeholder, future in hints:
+        show_suggestions(placeholder, future)
 
 
     col1, col2 = st.columns(2)
@@ -149,54 +194,53 @@ with tab1:
 
         st.info(f"📤 Отправка запроса на: {request_url}")
 
-        try:
-            response = requests.get(request_url, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-
-            if isinstance(data, list):
-                recipes = data
-                total_matches = len(recipes)
-            else:
-                recipes = data.get("recipes", []) if isinstance(data, dict) else []
-                total_matches = len(recipes)
-
-            search_entry = {
+        # Новый поиск - с первой страницы; курсоры следующих страниц копятся по мере листания,
+        # запись в историю добавляется, когда первая страница загрузится
+        st.session_state.search = {
+            "params": params,
+            "cursors": [None],
+            "page": 0,
+            "history": {
                 "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "search_type": search_type,
                 "ingredients": user_ingredients,
                 "title": recipe_title,
                 "max_time": max_time,
                 "difficulty": difficulty if difficulty != "Все" else None,
-                "found_recipes": total_matches,
-                "recipes": recipes[:2] if recipes else []
-            }
+            },
+        }
+        st.session_state.opened_recipes = set()
 
-            st.session_state.search_history.insert(0, search_entry)
-            if len(st.session_state.search_history) > 20:
-                st.session_state.search_history = st.session_state.search_history[:20]
+    active_search = st.session_state.get("search")
+    if active_search:
+        page_size = st.selectbox("Рецептов на странице", PAGE_SIZES, key="page_size", on_change=reset_pages)
+        try:
+            page = search_page(active_search["params"], page_size, active_search["cursors"][active_search["page"]])
+            recipes, next_cursor = page["items"], page["next_cursor"]
+
+            if "history" in active_search:
+                # В истории только id и названия первой страницы: для примеров тела рецептов не нужны
+                search_entry = active_search.pop("history")
+                search_entry.update(
+                    found_recipes=len(recipes),
+                    has_more=bool(next_cursor),
+                    recipes=[{"id": recipe["id"], "title": recipe["title"]} for recipe in recipes],
+                )
+                st.session_state.search_history.insert(0, search_entry)
+                if len(st.session_state.search_history) > 20:
+                    st.session_state.search_history = st.session_state.search_history[:20]
 
             if recipes:
-                st.success(f"✅ Найдено {total_matches} рецептов")
+                first = active_search["page"] * page_size + 1
+                more = ", есть ещё" if next_cursor else ""
+                st.success(f"✅ Рецепты {first}–{first + len(recipes) - 1}{more}")
                 st.markdown("---")
 
-                for i, recipe in enumerate(recipes):
-                    if isinstance(recipe, dict):
-                        title = recipe.get("title", f"Рецепт {i + 1}")
-                        time = recipe.get("cooking_time", "?")
-                        difficulty_val = recipe.get("difficulty", "?")
-                    else:
-                        title = f"Рецепт {i + 1}"
-                        time = "?"
-                        difficulty_val = "?"
-
-                    difficulty_display_map = {
-                        "easy": "легко",
-                        "medium": "средне",
-                        "hard": "сложно"
-                    }
-                    difficulty_display = difficulty_display_map.get(difficulty_val, difficulty_val)
+                for recipe in recipes:
+                    title = recipe.get("title", f"Рецепт {recipe['id']}")
+                    time = recipe.get("cooking_time", "?")
+                    difficulty_val = recipe.get("difficulty", "?")
+                    difficulty_display = DIFFICULTY_DISPLAY.get(difficulty_val, difficulty_val)
 
                     header = f"🍳 {title} | ⏱️ {time} мин | 🎯 {difficulty_display}"
 
@@ -204,24 +248,16 @@ with tab1:
                         st.markdown(f"**Название:** {title}")
                         st.markdown(f"**Время приготовления:** {time} мин")
                         st.markdown(f"**Сложность:** {difficulty_display}")
-                        if isinstance(recipe, dict) and 'ingredients' in recipe:
-                            st.markdown("**Ингредиенты:**")
-                            for ingredient in recipe['ingredients'][:10]:
-                                st.markdown(f"- {ingredient}")
-
-                            if len(recipe['ingredients']) > 10:
-                                st.caption(f"... и ещё {len(recipe['ingredients']) - 10} ингредиентов")
-                        instructions = ""
-                        if isinstance(recipe, dict):
-                            instructions = recipe.get('instructions', 'Инструкции отсутствуют.')
-
-                        st.text_area(
-                            "Инструкции",
-                            value=instructions,
-                            height=150,
-                            disabled=True,
-                            key=f"instructions_{i}"
-                        )
+                        # Тело рецепта запрашивается только для открытых рецептов, а не для всей страницы
+                        opened = recipe["id"] in st.session_state.opened_recipes
+                        if opened or st.button("📖 Показать рецепт", key=f"open_{recipe['id']}"):
+                            st.session_state.opened_recipes.add(recipe["id"])
+                            show_recipe_body(recipe["id"])
+
+                prev_col, page_col, next_col = st.columns([1, 2, 1])
+                prev_col.button("← Назад", disabled=active_search["page"] == 0, on_click=change_page, args=(-1,))
+                page_col.markdown(f"Страница {active_search['page'] + 1}")
+                next_col.button("Вперёд →", disabled=not next_cursor, on_click=change_page, args=(1, next_cursor))
 
             else:
                 st.warning("😕 Рецепты не найдены. Попробуйте изменить параметры поиска.")
@@ -235,12 +271,15 @@ with tab1:
 
 with tab2:
     st.header("Статистика по рецептам")
-    all_ingredients = get_all_recipes_data()
-    if all_ingredients:
-        ingredient_counts = Counter(all_ingredients)
+    try:
+        ingredient_counts = stats_future.result()
+    except requests.exceptions.RequestException as e:
+        st.error(f"Не удалось получить данные для статистики: {e}")
+        ingredient_counts = []
+    if ingredient_counts:
         st.subheader("Популярные ингредиенты")
         top_n = 10
-        top_ingredients_df = pd.DataFrame(ingredient_counts.most_common(top_n), columns=['Ингредиент', 'Частота'])
+        top_ingredients_df = pd.DataFrame(ingredient_counts[:top_n], columns=['Ингредиент', 'Частота'])
         chart = alt.Chart(top_ingredients_df).mark_bar(color='#2659e7').encode(
             x=alt.X('Ингредиент', sort='-y'),
             y='Частота',
@@ -251,7 +290,7 @@ with tab2:
         st.altair_chart(chart, use_container_width=True)
         st.markdown("---")
         st.subheader("Облако тегов (Часто используемые продукты)")
-        top_tags = ingredient_counts.most_common(30)
+        top_tags = ingredient_counts
         tag_html = ""
         max_count = top_tags[0][1] if top_tags else 1
         for ingredient, count in top_tags:
@@ -285,7 +324,8 @@ with tab3:
             else:
                 search_desc = f"Комбинированный поиск"
 
-            with st.expander(f"🔍 #{i + 1} - {search_desc} | Найдено: {search['found_recipes']}"):
+            found = f"{search['found_recipes']}+" if search.get('has_more') else search['found_recipes']
+            with st.expander(f"🔍 #{i + 1} - {search_desc} | Найдено: {found}"):
                 st.markdown(f"**⏰ Время:** {search['timestamp']}")
                 st.markdown(f"**🔎 Тип поиска:** {search['search_type']}")
 
@@ -300,9 +340,8 @@ with tab3:
                 if search['difficulty']:
                     st.markdown(f"**🎯 Сложность:** {search['difficulty']}")
 
-                st.markdown(f"**✅ Найдено рецептов:** {search['found_recipes']}")
+                st.markdown(f"**✅ Найдено рецептов:** {found}")
                 if search['recipes']:
                     st.markdown("**🍳 Примеры найденных рецептов:**")
-                    for recipe in search['recipes']:
-                        if isinstance(recipe, dict):
-                            st.markdown(f"- {recipe.get('title', 'Без названия')}")
+                    for recipe in search['recipes'][:2]:
+                        st.markdown(f"- {recipe['title'] or 'Без названия'}")